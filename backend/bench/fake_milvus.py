@@ -0,0 +1,220 @@
+"""进程内的pymilvus替身，用于在没有Milvus集群的环境下压测后端
+
+只实现后端实际用到的接口：connections、utility、Collection、DataType。
+所有调用按配置的延迟(带抖动)阻塞，并可按比例注入失败。
+install()须在导入main之前调用。
+"""
+import random
+import sys
+import threading
+import time
+import types
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FakeMilvusConfig:
+    """替身的行为配置，延迟单位为毫秒"""
+
+    def __init__(
+        self,
+        collections: Optional[Dict[str, Tuple[int, int]]] = None,
+        search_latency_ms: float = 5.0,
+        load_latency_ms: float = 50.0,
+        connect_latency_ms: float = 10.0,
+        metadata_latency_ms: float = 2.0,
+        jitter: float = 0.2,
+        search_failure_rate: float = 0.0,
+        connect_failure_rate: float = 0.0,
+        metric_type: str = "L2",
+        seed: Optional[int] = None
+    ):
+        # 集合名称 -> (实体数, 维度)
+        self.collections = collections or {"bench": (100000, 128)}
+        self.search_latency_ms = search_latency_ms
+        self.load_latency_ms = load_latency_ms
+        self.connect_latency_ms = connect_latency_ms
+        self.metadata_latency_ms = metadata_latency_ms
+        self.jitter = jitter
+        self.search_failure_rate = search_failure_rate
+        self.connect_failure_rate = connect_failure_rate
+        self.metric_type = metric_type
+        self.random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def uniform(self) -> float:
+        with self._random_lock:
+            return self.random.random()
+
+    def sleep(self, latency_ms: float) -> None:
+        if latency_ms <= 0:
+            return
+        factor = 1.0 + self.jitter * (2.0 * self.uniform() - 1.0)
+        time.sleep(max(0.0, latency_ms * factor) / 1000.0)
+
+    def maybe_fail(self, rate: float, message: str) -> None:
+        if rate > 0 and self.uniform() < rate:
+            raise Exception(message)
+
+
+class DataType:
+    INT64 = 5
+    VARCHAR = 21
+    BINARY_VECTOR = 100
+    FLOAT_VECTOR = 101
+
+
+class _FieldSchema:
+    def __init__(self, name: str, dtype: int, params: Optional[Dict[str, Any]] = None, is_primary: bool = False):
+        self.name = name
+        self.dtype = dtype
+        self.params = params or {}
+        self.is_primary = is_primary
+
+
+class _CollectionSchema:
+    def __init__(self, dim: int):
+        self.fields = [
+            _FieldSchema("id", DataType.INT64, is_primary=True),
+            _FieldSchema("embedding", DataType.FLOAT_VECTOR, {"dim": dim}),
+            _FieldSchema("title", DataType.VARCHAR)
+        ]
+        self.primary_field = self.fields[0]
+
+
+class _Index:
+    def __init__(self, metric_type: str):
+        self.field_name = "embedding"
+        self.params = {"index_type": "IVF_FLAT", "metric_type": metric_type, "params": {"nlist": 1024}}
+
+
+class _Entity:
+    def __init__(self, hit_id: int):
+        self._id = hit_id
+
+    def get(self, field: str) -> Any:
+        if field == "id":
+            return self._id
+        return f"{field}-{self._id}"
+
+
+class _Hit:
+    def __init__(self, hit_id: int, distance: float):
+        self.id = hit_id
+        self.distance = distance
+        self.entity = _Entity(hit_id)
+
+
+class _Hits:
+    def __init__(self, ids: List[int], distances: List[float]):
+        self.ids = ids
+        self.distances = distances
+
+    def __iter__(self):
+        return (_Hit(hit_id, distance) for hit_id, distance in zip(self.ids, self.distances))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class _SegmentInfo:
+    def __init__(self, mem_size: int):
+        self.mem_size = mem_size
+
+
+def build_module(config: FakeMilvusConfig) -> types.ModuleType:
+    """按配置构造一个可替换pymilvus的模块"""
+    module = types.ModuleType("pymilvus")
+    connected = set()
+    lock = threading.Lock()
+
+    class _Connections:
+        def connect(self, alias: str = "default", **kwargs: Any) -> None:
+            config.sleep(config.connect_latency_ms)
+            config.maybe_fail(config.connect_failure_rate, "fake milvus: failed to connect, server unavailable")
+            with lock:
+                connected.add(alias)
+
+        def disconnect(self, alias: str) -> None:
+            with lock:
+                connected.discard(alias)
+
+        def has_connection(self, alias: str) -> bool:
+            with lock:
+                return alias in connected
+
+    class _Utility:
+        def list_collections(self, using: str = "default", timeout: Optional[float] = None) -> List[str]:
+            config.sleep(config.metadata_latency_ms)
+            return list(config.collections)
+
+        def get_server_version(self, using: str = "default", timeout: Optional[float] = None) -> str:
+            config.sleep(config.metadata_latency_ms)
+            return "v2.2.3-fake"
+
+        def get_query_segment_info(self, collection_name: str, using: str = "default", **kwargs: Any) -> List[Any]:
+            num_entities, dim = config.collections[collection_name]
+            return [_SegmentInfo(num_entities * dim * 4)]
+
+    class Collection:
+        def __init__(self, name: str, using: str = "default", **kwargs: Any):
+            if name not in config.collections:
+                raise Exception(f"fake milvus: can't find collection: {name}")
+            config.sleep(config.metadata_latency_ms)
+            self.name = name
+            self.using = using
+            self._num_entities, self._dim = config.collections[name]
+            self.schema = _CollectionSchema(self._dim)
+
+        @property
+        def indexes(self) -> List[_Index]:
+            return [_Index(config.metric_type)]
+
+        @property
+        def num_entities(self) -> int:
+            config.sleep(config.metadata_latency_ms)
+            return self._num_entities
+
+        def load(self, **kwargs: Any) -> None:
+            config.sleep(config.load_latency_ms)
+
+        def release(self, **kwargs: Any) -> None:
+            pass
+
+        def search(
+            self,
+            data: Any,
+            anns_field: str,
+            param: Dict[str, Any],
+            limit: int,
+            output_fields: Optional[List[str]] = None,
+            **kwargs: Any
+        ) -> List[_Hits]:
+            with lock:
+                if self.using not in connected:
+                    raise Exception("fake milvus: connection unavailable")
+            config.sleep(config.search_latency_ms)
+            config.maybe_fail(config.search_failure_rate, "fake milvus: injected search failure")
+            larger_is_better = (param.get("metric_type") or config.metric_type).upper() in ("IP", "COSINE")
+            limit = min(limit, self._num_entities)
+            results = []
+            for _ in range(len(data)):
+                with config._random_lock:
+                    ids = config.random.sample(range(self._num_entities), limit)
+                    distances = sorted((config.random.random() for _ in range(limit)), reverse=larger_is_better)
+                results.append(_Hits(ids, distances))
+            return results
+
+    module.connections = _Connections()
+    module.utility = _Utility()
+    module.Collection = Collection
+    module.DataType = DataType
+    return module
+
+
+def install(config: Optional[FakeMilvusConfig] = None) -> FakeMilvusConfig:
+    """用替身替换pymilvus模块，返回使用的配置"""
+    if "main" in sys.modules:
+        raise RuntimeError("必须在导入main之前安装pymilvus替身")
+    config = config or FakeMilvusConfig()
+    sys.modules["pymilvus"] = build_module(config)
+    return config
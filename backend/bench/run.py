@@ -0,0 +1,228 @@
+"""离线压测：在进程内用pymilvus替身运行main.app，按指定并发驱动查询与统计接口
+
+依赖httpx，需先安装开发依赖: pip install -r requirements-dev.txt
+
+示例(在backend目录下运行):
+    python -m bench.run --scenarios vector,multi --concurrency 32 --requests 2000
+    python -m bench.run --search-latency-ms 20 --search-failure-rate 0.01 --json
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+
+from bench.fake_milvus import FakeMilvusConfig, install
+
+SCENARIOS = ("vector", "multi", "upload", "statistics")
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="向量查询后端的离线压测")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗号分隔，可选: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发请求数")
+    parser.add_argument("--requests", type=int, default=500, help="每个场景的请求总数")
+    parser.add_argument("--warmup", type=int, default=20, help="每个场景正式计时前的预热请求数")
+    parser.add_argument("--databases", type=int, default=3, help="创建的数据库连接数(多数据库查询使用全部连接)")
+    parser.add_argument("--collection-size", type=int, default=100000, help="每个集合的实体数")
+    parser.add_argument("--dim", type=int, default=128, help="向量维度")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nq", type=int, default=1, help="每个查询请求的向量数")
+    parser.add_argument("--upload-nq", type=int, default=256, help="上传文件查询的向量数")
+    parser.add_argument("--output-fields", default="title", help="逗号分隔的输出字段，为空则不返回字段")
+    parser.add_argument("--search-latency-ms", type=float, default=5.0)
+    parser.add_argument("--load-latency-ms", type=float, default=50.0)
+    parser.add_argument("--connect-latency-ms", type=float, default=10.0)
+    parser.add_argument("--metadata-latency-ms", type=float, default=2.0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟的相对抖动幅度")
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--connect-failure-rate", type=float, default=0.0)
+    parser.add_argument("--coalesce", action="store_true", help="启用查询合并")
+    parser.add_argument("--coalesce-window-ms", type=float, default=2.0)
+    parser.add_argument("--coalesce-max-vectors", type=int, default=64)
+    parser.add_argument("--fresh-statistics", action="store_true", help="统计接口每次都重新收集，而不是使用快照")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    parser.add_argument("--log-level", default="WARNING", help="压测期间应用的日志级别")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace, workdir: str) -> None:
+    """在导入main之前设置：使用临时数据文件，慢查询日志写入临时目录"""
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "database.json")
+    os.environ["SLOW_QUERY_LOG_PATH"] = os.path.join(workdir, "slow_queries.jsonl")
+    if args.coalesce:
+        os.environ["QUERY_COALESCE_ENABLED"] = "true"
+        os.environ["QUERY_COALESCE_WINDOW_MS"] = str(args.coalesce_window_ms)
+        os.environ["QUERY_COALESCE_MAX_VECTORS"] = str(args.coalesce_max_vectors)
+    install(FakeMilvusConfig(
+        collections={"bench": (args.collection_size, args.dim)},
+        search_latency_ms=args.search_latency_ms,
+        load_latency_ms=args.load_latency_ms,
+        connect_latency_ms=args.connect_latency_ms,
+        metadata_latency_ms=args.metadata_latency_ms,
+        jitter=args.jitter,
+        search_failure_rate=args.search_failure_rate,
+        connect_failure_rate=args.connect_failure_rate,
+        seed=args.seed
+    ))
+
+
+def summarize(name: str, latencies: List[float], statuses: List[int], elapsed: float) -> Dict[str, Any]:
+    """吞吐量与延迟分位数(毫秒)"""
+    values = np.asarray(latencies) * 1000.0
+    errors = sum(1 for status in statuses if status >= 400)
+    summary = {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "mean_ms": float(values.mean()) if len(values) else 0.0
+    }
+    for percentile in (50, 90, 99):
+        summary[f"p{percentile}_ms"] = float(np.percentile(values, percentile)) if len(values) else 0.0
+    summary["max_ms"] = float(values.max()) if len(values) else 0.0
+    return summary
+
+
+async def drive(
+    send: Callable[[int], Any],
+    total: int,
+    concurrency: int
+) -> Tuple[List[float], List[int], float]:
+    """以固定并发发送total个请求，返回各请求延迟、状态码和总耗时"""
+    latencies: List[float] = []
+    statuses: List[int] = []
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        for index in counter:
+            start = time.perf_counter()
+            response = await send(index)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def run_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+    import main
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    rng = np.random.default_rng(args.seed)
+    output_fields = [field for field in args.output_fields.split(",") if field]
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"未知的场景: {', '.join(sorted(unknown))}")
+
+    await main.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+            response = await client.post("/api/auth/login", data={"username": "admin", "password": "admin123"})
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            database_ids = []
+            for index in range(args.databases):
+                response = await client.post(
+                    "/api/database/connections",
+                    json={"name": f"bench-{index}", "host": "fake", "port": 19530 + index},
+                    headers=headers
+                )
+                response.raise_for_status()
+                database_ids.append(response.json()["id"])
+                await client.post(f"/api/database/connections/{database_ids[-1]}/connect", headers=headers)
+
+            def query_vectors() -> List[List[float]]:
+                return rng.random((args.nq, args.dim), dtype=np.float32).tolist()
+
+            def vector_request(index: int) -> Any:
+                return client.post("/api/query/vector", headers=headers, json={
+                    "database_id": database_ids[index % len(database_ids)],
+                    "collection_name": "bench",
+                    "vector_data": query_vectors(),
+                    "top_k": args.top_k,
+                    "output_fields": output_fields or None,
+                    "use_cache": False
+                })
+
+            def multi_request(index: int) -> Any:
+                return client.post("/api/query/multi", headers=headers, json={
+                    "database_ids": database_ids,
+                    "collection_names": {database_id: "bench" for database_id in database_ids},
+                    "vector_data": query_vectors(),
+                    "top_k": args.top_k,
+                    "output_fields": output_fields or None,
+                    "use_cache": False
+                })
+
+            upload = io.BytesIO()
+            np.save(upload, rng.random((args.upload_nq, args.dim), dtype=np.float32))
+            upload_bytes = upload.getvalue()
+
+            def upload_request(index: int) -> Any:
+                return client.post("/api/query/upload-vector", headers=headers, data={
+                    "database_id": database_ids[index % len(database_ids)],
+                    "collection_name": "bench",
+                    "top_k": str(args.top_k)
+                }, files={"vector_file": ("vectors.npy", upload_bytes, "application/octet-stream")})
+
+            def statistics_request(index: int) -> Any:
+                database_id = database_ids[index % len(database_ids)]
+                return client.get(
+                    f"/api/database/connections/{database_id}/statistics",
+                    params={"fresh": "true"} if args.fresh_statistics else None,
+                    headers=headers
+                )
+
+            requests = {
+                "vector": vector_request,
+                "multi": multi_request,
+                "upload": upload_request,
+                "statistics": statistics_request
+            }
+            results = []
+            for name in scenarios:
+                if args.warmup > 0:
+                    await drive(requests[name], args.warmup, args.concurrency)
+                latencies, statuses, elapsed = await drive(requests[name], args.requests, args.concurrency)
+                results.append(summarize(name, latencies, statuses, elapsed))
+            return results
+    finally:
+        await main.app.router.shutdown()
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    columns = ("scenario", "requests", "errors", "throughput", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+    print("".join(f"{column:>12}" for column in columns))
+    for result in results:
+        print("".join(
+            f"{result[column]:>12.2f}" if isinstance(result[column], float) else f"{result[column]:>12}"
+            for column in columns
+        ))
+
+
+def main(argv: List[str]) -> None:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="fedui-bench-") as workdir:
+        configure_environment(args, workdir)
+        results = asyncio.run(run_benchmark(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
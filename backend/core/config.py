@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import List, Optional
 from pydantic import BaseSettings
 from dotenv import load_dotenv
 
@@ -14,6 +14,8 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7天
     ALGORITHM: str = "HS256"
+    AUTH_CACHE_MAX_ENTRIES: int = 10000  # 已验证令牌缓存的最大条目数
+    AUTH_CACHE_TTL: float = 60.0  # 已验证令牌的重新验证间隔(秒)，也是用户被禁用或修改权限后生效的最长延迟
     
     # CORS设置
     CORS_ORIGINS: List[str] = [
@@ -25,5 +27,70 @@ class Settings(BaseSettings):
 
     # 数据库设置
     DATABASE_PATH: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data/database.json")
+    METADATA_FLUSH_DELAY: float = 0.5  # 元数据修改后延迟批量写回的时间(秒)，0表示立即写回
+    METADATA_MTIME_CHECK_INTERVAL: float = 1.0  # 检查数据文件是否被外部修改的间隔(秒)
+
+    # 线程池设置：阻塞调用在独立线程池中执行，避免阻塞事件循环
+    MILVUS_IO_WORKERS: int = 32  # Milvus查询与管理调用的线程数
+    AUTH_WORKERS: int = 4  # bcrypt密码校验与哈希的线程数
+    FILE_IO_WORKERS: int = 4  # 上传文件写入磁盘的线程数
+
+    # 多数据库查询设置
+    MULTI_DB_MAX_WORKERS: int = 16  # 并发查询的最大线程数
+    MULTI_DB_QUERY_TIMEOUT: float = 10.0  # 单个数据库的默认查询超时(秒)
+    MULTI_DB_MAX_QUERY_TIMEOUT: float = 300.0  # 请求中可指定的单个数据库查询超时上限(秒)
+
+    # Milvus连接池设置
+    MILVUS_POOL_SIZE: int = 4  # 每个数据库的连接(gRPC通道)数量
+    MILVUS_HEALTH_CHECK_INTERVAL: float = 30.0  # 存活探测间隔(秒)
+    MILVUS_RECONNECT_BACKOFF_MIN: float = 1.0  # 重连退避的初始间隔(秒)
+    MILVUS_RECONNECT_BACKOFF_MAX: float = 60.0  # 重连退避的最大间隔(秒)
+    MILVUS_CONNECT_TIMEOUT: float = 10.0  # 建立连接的超时(秒)
+    MILVUS_ACQUIRE_TIMEOUT: float = 5.0  # 请求等待后台建立连接的最长时间(秒)
+
+    # 已加载集合管理设置(可在每个数据库连接上单独覆盖)，0表示不限制
+    MILVUS_MAX_LOADED_COLLECTIONS: int = 0  # 每个数据库同时加载的集合数量上限
+    MILVUS_LOADED_MEMORY_BUDGET_MB: int = 0  # 每个数据库已加载集合的内存预算(MB)
+
+    # 集合结构缓存设置
+    COLLECTION_SCHEMA_TTL: float = 300.0  # 缓存的集合结构最长有效期(秒)，0表示不过期
+
+    # 数据库统计信息设置
+    STATS_MAX_WORKERS: int = 16  # 并发收集集合统计信息的线程数
+    STATS_SNAPSHOT_TTL: float = 300.0  # 统计快照的最长有效期(秒)
+    STATS_REFRESH_INTERVAL: float = 60.0  # 后台刷新统计快照的间隔(秒)
+    STATS_REFRESH_IDLE_TIMEOUT: float = 600.0  # 超过该时间未被访问的数据库不再后台刷新(秒)
+
+    # 向量文件上传设置
+    UPLOAD_SPOOL_DIR: Optional[str] = None  # 上传文件的临时目录，默认使用系统临时目录
+    UPLOAD_QUERY_BATCH_SIZE: int = 1000  # 上传文件查询时每批发送的向量数(nq)
+
+    # 查询结果缓存设置
+    QUERY_CACHE_ENABLED: bool = False  # 是否启用查询结果缓存
+    QUERY_CACHE_TTL: float = 60.0  # 缓存结果的有效期(秒)
+    QUERY_CACHE_MAX_MB: int = 256  # 缓存结果的内存预算(MB)
+
+    # 查询合并设置：相同参数的并发查询在时间窗口内合并为一次nq批量查询
+    QUERY_COALESCE_ENABLED: bool = False  # 是否启用查询合并
+    QUERY_COALESCE_WINDOW_MS: float = 2.0  # 第一个请求等待其他请求加入的最长时间(毫秒)
+    QUERY_COALESCE_MAX_VECTORS: int = 64  # 单个批次的最大向量数，凑满后立即发送
+
+    # 相同请求合并设置
+    SINGLE_FLIGHT_ENABLED: bool = True  # 完全相同的进行中查询是否共享一次执行的结果
+
+    # 慢查询日志设置
+    SLOW_QUERY_LOG_ENABLED: bool = True  # 是否记录慢查询
+    SLOW_QUERY_THRESHOLD: float = 1.0  # 执行时间超过该值(秒)的查询记为慢查询
+    SLOW_QUERY_LOG_PATH: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data/slow_queries.jsonl")
+    SLOW_QUERY_LOG_MAX_MB: int = 16  # 单个日志文件的大小上限(MB)，超过后轮转
+    SLOW_QUERY_LOG_BACKUP_COUNT: int = 3  # 保留的轮转日志文件数
+    SLOW_QUERY_LOG_QUEUE_SIZE: int = 10000  # 待写入记录的队列长度，队列满时丢弃新记录
+
+    # 本地向量引擎设置
+    LOCAL_ENGINE_BUFFER_MB: int = 64  # 本地暴力检索时每块得分矩阵及向量块的内存上限(MB)，决定每块扫描的向量数
+
+    # 查询参数评估设置
+    EVAL_MAX_BASE_MB: int = 512  # 从Milvus读取已存储向量计算精确真值时的内存上限(MB)，超过则拒绝评估
+    EVAL_FETCH_PAGE_SIZE: int = 10000  # 从Milvus分页读取已存储向量时每页的条数
 
 settings = Settings() 
\ No newline at end of file
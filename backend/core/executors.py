@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from core.config import settings
+from core.metrics import registry
+
+
+class InstrumentedExecutor:
+    """带排队统计的线程池，用于把阻塞调用移出事件循环"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_queue_time = 0.0
+        self.max_queue_time = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在线程池中执行阻塞函数并等待结果，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.submitted += 1
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(self._call, fn, time.time(), args, kwargs)
+        )
+
+    def _call(self, fn: Callable[..., Any], submitted_at: float, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        queue_time = time.time() - submitted_at
+        with self._lock:
+            self.started += 1
+            self.total_queue_time += queue_time
+            self.max_queue_time = max(self.max_queue_time, queue_time)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self.submitted - self.started,
+                "active": self.started - self.completed,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_queue_time": self.total_queue_time / self.started if self.started else 0.0,
+                "max_queue_time": self.max_queue_time
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# Milvus的gRPC调用
+milvus_executor = InstrumentedExecutor("milvus-io", settings.MILVUS_IO_WORKERS)
+# bcrypt密码校验与哈希
+auth_executor = InstrumentedExecutor("password-hash", settings.AUTH_WORKERS)
+# 上传文件的磁盘写入
+file_executor = InstrumentedExecutor("file-io", settings.FILE_IO_WORKERS)
+
+def executor_stats() -> Dict[str, Any]:
+    """所有线程池的排队与执行情况"""
+    return {executor.name: executor.stats() for executor in (milvus_executor, auth_executor, file_executor)}
+
+registry.gauge(
+    "fedui_executor_tasks",
+    "Queued and running tasks per thread pool",
+    ("executor", "state"),
+    lambda: [
+        ((name, state), stats[state])
+        for name, stats in executor_stats().items()
+        for state in ("queue_depth", "active")
+    ]
+)
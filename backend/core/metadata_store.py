@@ -0,0 +1,336 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import List, Dict, Any, Optional, Callable
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataStore:
+    """用户和数据库连接元数据的内存存储
+
+    数据文件只在启动时(或检测到外部修改时)读取一次，按ID和用户名/连接名称建立字典索引；
+    写操作只修改内存并标记为脏，由后台定时批量写回，写回时先写临时文件再原子替换。
+    """
+
+    def __init__(self, path: str, flush_delay: float, mtime_check_interval: float):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.mtime_check_interval = mtime_check_interval
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._data: Dict[str, Any] = {}
+        self._users_by_id: Dict[str, Dict] = {}
+        self._users_by_username: Dict[str, Dict] = {}
+        self._connections_by_id: Dict[str, Dict] = {}
+        self._connections_by_name: Dict[str, Dict] = {}
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        # 写文件在self._lock之外进行，由写锁保证顺序
+        self._write_lock = threading.Lock()
+        self._snapshot_version = 0
+        self._written_version = 0
+        self._pending_writes = 0
+        # 启动时数据文件无法读取，此时不写回，以免覆盖原有数据
+        self._load_failed = False
+        self._default_factory: Optional[Callable[[], Dict[str, Any]]] = None
+        self._reload_listeners: List[Callable[[], None]] = []
+
+    def set_default_factory(self, factory: Callable[[], Dict[str, Any]]) -> None:
+        """设置数据文件不存在时使用的初始数据"""
+        self._default_factory = factory
+
+    def add_reload_listener(self, listener: Callable[[], None]) -> None:
+        """注册数据被外部修改并重新加载后的回调"""
+        self._reload_listeners.append(listener)
+
+    # ---- 用户 ----
+
+    def list_users(self) -> List[Dict]:
+        with self._lock:
+            self._ensure_fresh()
+            return copy.deepcopy(self._data["users"])
+
+    def get_user_by_id(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._ensure_fresh()
+            return copy.deepcopy(self._users_by_id.get(user_id))
+
+    def get_user_by_username(self, username: str) -> Optional[Dict]:
+        with self._lock:
+            self._ensure_fresh()
+            return copy.deepcopy(self._users_by_username.get(username))
+
+    def add_user(self, user: Dict) -> None:
+        with self._lock:
+            self._ensure_fresh()
+            if user["username"] in self._users_by_username:
+                raise ValueError("用户名已存在")
+            user = copy.deepcopy(user)
+            self._data["users"].append(user)
+            self._index_user(user)
+            self._mark_dirty()
+
+    def replace_users(self, users: List[Dict]) -> None:
+        with self._lock:
+            self._ensure_fresh()
+            self._data["users"] = copy.deepcopy(users)
+            self._rebuild_indexes()
+            self._mark_dirty()
+
+    # ---- 数据库连接 ----
+
+    def list_connections(self) -> List[Dict]:
+        with self._lock:
+            self._ensure_fresh()
+            return copy.deepcopy(self._data["database_connections"])
+
+    def get_connection(self, connection_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._ensure_fresh()
+            return copy.deepcopy(self._connections_by_id.get(connection_id))
+
+    def get_connection_by_name(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            self._ensure_fresh()
+            return copy.deepcopy(self._connections_by_name.get(name))
+
+    def add_connection(self, connection: Dict) -> None:
+        with self._lock:
+            self._ensure_fresh()
+            if connection["name"] in self._connections_by_name:
+                raise ValueError("连接名称已存在")
+            connection = copy.deepcopy(connection)
+            self._data["database_connections"].append(connection)
+            self._index_connection(connection)
+            self._mark_dirty()
+
+    def update_connection(self, connection_id: str, changes: Dict[str, Any]) -> Optional[Dict]:
+        """更新连接字段，返回更新后的连接"""
+        with self._lock:
+            self._ensure_fresh()
+            connection = self._connections_by_id.get(connection_id)
+            if connection is None:
+                return None
+            new_name = changes.get("name")
+            if new_name is not None and new_name != connection["name"]:
+                if new_name in self._connections_by_name:
+                    raise ValueError("连接名称已存在")
+                del self._connections_by_name[connection["name"]]
+                self._connections_by_name[new_name] = connection
+            connection.update(copy.deepcopy(changes))
+            self._mark_dirty()
+            return copy.deepcopy(connection)
+
+    def modify_connection(
+        self,
+        connection_id: str,
+        modify: Callable[[Dict[str, Any]], Dict[str, Any]]
+    ) -> Optional[Dict]:
+        """在锁内根据连接的当前内容计算修改并应用，并发的读-改-写不会互相覆盖
+
+        modify接收连接的副本，返回要更新的字段；返回空字典时不做修改。连接不存在时返回None。
+        """
+        with self._lock:
+            self._ensure_fresh()
+            connection = self._connections_by_id.get(connection_id)
+            if connection is None:
+                return None
+            changes = modify(copy.deepcopy(connection))
+            if not changes:
+                return copy.deepcopy(connection)
+            return self.update_connection(connection_id, changes)
+
+    def delete_connection(self, connection_id: str) -> bool:
+        with self._lock:
+            self._ensure_fresh()
+            connection = self._connections_by_id.pop(connection_id, None)
+            if connection is None:
+                return False
+            self._connections_by_name.pop(connection["name"], None)
+            self._data["database_connections"] = [
+                conn for conn in self._data["database_connections"] if conn["id"] != connection_id
+            ]
+            self._mark_dirty()
+            return True
+
+    def replace_connections(self, connections_data: List[Dict]) -> None:
+        with self._lock:
+            self._ensure_fresh()
+            self._data["database_connections"] = copy.deepcopy(connections_data)
+            self._rebuild_indexes()
+            self._mark_dirty()
+
+    # ---- 持久化 ----
+
+    def flush(self) -> None:
+        """立即将未写回的修改写入数据文件
+
+        持有锁时只复制数据快照并清除脏标记，序列化、写临时文件和fsync在锁外进行，写回期间读请求不会等待磁盘I/O；
+        写回由单独的写锁串行执行，较旧的快照不会覆盖已写入的较新快照。
+        """
+        with self._lock:
+            if self._flush_timer:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            if self._load_failed:
+                # 不能用读取失败后的空数据覆盖原有的数据文件
+                logger.error(f"元数据文件 {self.path} 读取失败，修改不会写回，请修复该文件")
+                return
+            snapshot = copy.deepcopy(self._data)
+            self._dirty = False
+            self._snapshot_version += 1
+            version = self._snapshot_version
+            self._pending_writes += 1
+        try:
+            with self._write_lock:
+                if version > self._written_version:
+                    self._atomic_write(json.dumps(snapshot, ensure_ascii=False, indent=4))
+                    self._written_version = version
+        except Exception as e:
+            logger.error(f"保存元数据时出错: {e}")
+            with self._lock:
+                self._dirty = True
+        finally:
+            with self._lock:
+                self._pending_writes -= 1
+
+    def _atomic_write(self, content: str) -> None:
+        """先写入同目录下的临时文件，再原子替换数据文件"""
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".database.", suffix=".tmp", dir=directory)
+        try:
+            # 保留原文件的权限(mkstemp创建的临时文件仅属主可读写)
+            mode = os.stat(self.path).st_mode & 0o777 if os.path.exists(self.path) else 0o644
+            os.chmod(tmp_path, mode)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._mtime = os.stat(self.path).st_mtime
+
+    def _mark_dirty(self) -> None:
+        """标记数据已修改，并安排延迟批量写回(调用时需持有锁)"""
+        self._dirty = True
+        if self.flush_delay <= 0:
+            self.flush()
+            return
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    # ---- 加载与外部修改检测 ----
+
+    def _ensure_fresh(self) -> None:
+        """首次访问时加载数据；之后按间隔检查文件修改时间，发现外部修改时重新加载(调用时需持有锁)"""
+        if not self._loaded:
+            self._load()
+            return
+        now = time.time()
+        if now - self._last_check < self.mtime_check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        if self._pending_writes:
+            # 正在写回，修改时间来自本进程的写入
+            return
+        if self._dirty and not self._load_failed:
+            logger.warning("元数据文件已被外部修改，但内存中有未写回的修改，将以内存数据为准")
+            return
+        logger.info("检测到元数据文件被外部修改，重新加载")
+        try:
+            data = self._read()
+        except (ValueError, OSError) as e:
+            # 可能是其他进程正在写入，保留当前数据，下次检查时重试
+            logger.warning(f"重新加载元数据文件时出错，继续使用内存中的数据: {e}")
+            return
+        self._set_data(data)
+        # 读取失败期间在空数据上做的修改无法保存，以文件内容为准
+        self._dirty = False
+        self._load_failed = False
+        for listener in self._reload_listeners:
+            listener()
+
+    def _load(self) -> None:
+        data = None
+        if os.path.exists(self.path):
+            try:
+                data = self._read()
+            except (ValueError, OSError) as e:
+                logger.error(f"读取元数据文件时出错，修复该文件前不会写回修改: {e}")
+                self._load_failed = True
+                data = {}
+        elif self._default_factory:
+            # 数据文件不存在时写入初始数据
+            data = copy.deepcopy(self._default_factory())
+            self._data = data
+            self._atomic_write(json.dumps(data, ensure_ascii=False, indent=4))
+        self._set_data(data or {})
+        self._loaded = True
+
+    def _read(self) -> Dict[str, Any]:
+        """读取数据文件，内容无效时抛出ValueError"""
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("元数据文件的内容不是JSON对象")
+        self._mtime = mtime
+        return data
+
+    def _set_data(self, data: Dict[str, Any]) -> None:
+        data.setdefault("users", [])
+        data.setdefault("database_connections", [])
+        self._data = data
+        self._rebuild_indexes()
+        self._last_check = time.time()
+
+    def _rebuild_indexes(self) -> None:
+        self._users_by_id = {}
+        self._users_by_username = {}
+        self._connections_by_id = {}
+        self._connections_by_name = {}
+        for user in self._data["users"]:
+            self._index_user(user)
+        for connection in self._data["database_connections"]:
+            self._index_connection(connection)
+
+    def _index_user(self, user: Dict) -> None:
+        self._users_by_id[user["id"]] = user
+        self._users_by_username[user["username"]] = user
+
+    def _index_connection(self, connection: Dict) -> None:
+        self._connections_by_id[connection["id"]] = connection
+        self._connections_by_name[connection["name"]] = connection
+
+
+metadata_store = MetadataStore(
+    path=settings.DATABASE_PATH,
+    flush_delay=settings.METADATA_FLUSH_DELAY,
+    mtime_check_interval=settings.METADATA_MTIME_CHECK_INTERVAL
+)
+
+# 进程退出前写回未保存的修改
+atexit.register(metadata_store.flush)
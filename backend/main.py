@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Form
+from fastapi import FastAPI, Depends, HTTPException, status, Form, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Dict, Any, Optional
 import uvicorn
@@ -8,7 +8,15 @@ from routes import auth, database, query
 from core.config import settings
 from services.user import authenticate_user
 from schemas.user import Token
-from core.security import create_access_token
+from core.executors import auth_executor, file_executor, milvus_executor, executor_stats
+from core.metadata_store import metadata_store
+from core.metrics import registry
+from core.security import create_access_token, get_admin_user
+from schemas.user import User
+from services.connection_pool import connection_manager
+from services.database import get_db_connections, start_statistics_refresher, stop_statistics_refresher
+from services.local_engine import is_local
+from services.slow_query_log import slow_query_log
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -34,6 +42,22 @@ app.include_router(auth.router, prefix="/api/auth", tags=["认证"])
 app.include_router(database.router, prefix="/api/database", tags=["数据库管理"])
 app.include_router(query.router, prefix="/api/query", tags=["向量查询"])
 
+@app.on_event("startup")
+async def startup():
+    """启动连接管理器和统计快照刷新线程，在后台预热所有已配置Milvus数据库的连接"""
+    connection_manager.start([connection for connection in get_db_connections() if not is_local(connection)])
+    start_statistics_refresher()
+
+@app.on_event("shutdown")
+async def shutdown():
+    stop_statistics_refresher()
+    connection_manager.stop()
+    metadata_store.flush()
+    slow_query_log.stop()
+    milvus_executor.shutdown()
+    auth_executor.shutdown()
+    file_executor.shutdown()
+
 @app.get("/")
 async def root():
     logger.info("访问根路径")
@@ -56,6 +80,16 @@ async def debug():
         })
     return {"routes": routes}
 
+@app.get("/api/executors")
+async def executors(admin: User = Depends(get_admin_user)):
+    """线程池的排队深度与执行情况"""
+    return executor_stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus格式的指标：各查询阶段的延迟直方图、错误与缓存命中计数、连接池与线程池状态"""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # 直接在主应用中添加登录端点
 @app.post("/api/direct-login", response_model=Token)
 async def direct_login(
@@ -64,7 +98,7 @@ async def direct_login(
 ):
     """直接登录端点，绕过路由模块"""
     logger.info(f"尝试直接登录: {username}")
-    user = authenticate_user(username, password)
+    user = await auth_executor.run(authenticate_user, username, password)
     if not user:
         logger.warning(f"直接登录失败: {username}")
         raise HTTPException(
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
-from typing import Any, List
+from typing import Any, Dict, List
 import logging
 
 from schemas.user import User, UserCreate, Token
-from core.security import create_access_token, get_current_user, get_admin_user
+from core.executors import auth_executor
+from core.security import create_access_token, get_current_user, get_admin_user, principal_cache
 from core.config import settings
 from services.user import authenticate_user, create_user, get_user_by_username
 
@@ -16,7 +17,7 @@ logger = logging.getLogger(__name__)
 async def login_access_token(form_data: OAuth2PasswordRequestForm = Depends()) -> Any:
     """获取OAuth2兼容的token"""
     logger.info(f"尝试OAuth2登录: {form_data.username}")
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await auth_executor.run(authenticate_user, form_data.username, form_data.password)
     if not user:
         logger.warning(f"OAuth2登录失败: {form_data.username}")
         raise HTTPException(
@@ -39,7 +40,7 @@ async def simple_login(
 ) -> Any:
     """简单表单登录，获取访问令牌"""
     logger.info(f"尝试简单登录: {username}")
-    user = authenticate_user(username, password)
+    user = await auth_executor.run(authenticate_user, username, password)
     if not user:
         logger.warning(f"简单登录失败: {username}")
         raise HTTPException(
@@ -67,7 +68,7 @@ async def register_user(user_in: UserCreate, admin: User = Depends(get_admin_use
     
     # 创建新用户
     try:
-        user = create_user(user_in)
+        user = await auth_executor.run(create_user, user_in)
         return user
     except ValueError as e:
         raise HTTPException(
@@ -78,4 +79,9 @@ async def register_user(user_in: UserCreate, admin: User = Depends(get_admin_use
 @router.get("/me", response_model=User)
 async def read_current_user(current_user: User = Depends(get_current_user)) -> Any:
     """获取当前用户信息"""
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+@router.get("/principal-cache", response_model=Dict[str, Any])
+async def get_principal_cache_stats(admin: User = Depends(get_admin_user)) -> Any:
+    """获取已验证令牌缓存的命中率"""
+    return principal_cache.stats()
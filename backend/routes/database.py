@@ -7,8 +7,10 @@ from schemas.database import (
     DatabaseConnectionCreate,
     DatabaseConnectionUpdate,
     DatabaseStatus,
-    DatabaseStatistics
+    DatabaseStatistics,
+    SearchProfile
 )
+from core.executors import milvus_executor
 from core.security import get_current_user, get_admin_user
 from services.database import (
     get_db_connections,
@@ -19,6 +21,18 @@ from services.database import (
     disconnect_from_db,
     get_db_statistics
 )
+from services.collection_cache import collection_cache
+from services.collection_registry import collection_registry
+from services.connection_pool import connection_manager
+from services.local_engine import local_engine
+from services.result_cache import result_cache
+from services.search_profiles import (
+    get_search_profiles,
+    save_search_profile,
+    delete_search_profile,
+    set_default_search_profile,
+    profile_to_search_params
+)
 
 router = APIRouter()
 
@@ -49,8 +63,14 @@ async def update_connection(
     connection_in: DatabaseConnectionUpdate,
     admin: User = Depends(get_admin_user)
 ) -> Any:
-    """更新数据库连接"""
-    connection = update_db_connection(connection_id, connection_in)
+    """更新数据库连接，连接参数变化时的断开与重连在线程池中执行"""
+    try:
+        connection = await milvus_executor.run(update_db_connection, connection_id, connection_in)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     if not connection:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -63,8 +83,8 @@ async def delete_connection(
     connection_id: str,
     admin: User = Depends(get_admin_user)
 ) -> Any:
-    """删除数据库连接"""
-    success = delete_db_connection(connection_id)
+    """删除数据库连接，关闭连接池在线程池中执行"""
+    success = await milvus_executor.run(delete_db_connection, connection_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -79,7 +99,7 @@ async def connect_to_database(
 ) -> Any:
     """连接到数据库"""
     try:
-        status = connect_to_db(connection_id)
+        status = await milvus_executor.run(connect_to_db, connection_id)
         return status
     except ValueError as e:
         raise HTTPException(
@@ -94,7 +114,7 @@ async def disconnect_from_database(
 ) -> Any:
     """断开与数据库的连接"""
     try:
-        status = disconnect_from_db(connection_id)
+        status = await milvus_executor.run(disconnect_from_db, connection_id)
         return status
     except ValueError as e:
         raise HTTPException(
@@ -105,14 +125,117 @@ async def disconnect_from_database(
 @router.get("/connections/{connection_id}/statistics", response_model=DatabaseStatistics)
 async def get_database_statistics(
     connection_id: str,
+    fresh: bool = False,
     current_user: User = Depends(get_current_user)
 ) -> Any:
-    """获取数据库统计信息"""
+    """获取数据库统计信息，fresh为True时跳过快照重新收集"""
     try:
-        stats = get_db_statistics(connection_id)
+        stats = await milvus_executor.run(get_db_statistics, connection_id, fresh)
         return stats
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        ) 
\ No newline at end of file
+        ) 
+
+@router.get("/connections/{connection_id}/search-profiles", response_model=Dict[str, Dict[str, Any]])
+async def get_connection_search_profiles(
+    connection_id: str,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """获取数据库各集合的命名查询参数配置，集合名称为"*"的配置对所有集合生效"""
+    try:
+        return get_search_profiles(connection_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+@router.put("/connections/{connection_id}/search-profiles/{collection_name}/{profile_name}", response_model=Dict[str, Any])
+async def put_search_profile(
+    connection_id: str,
+    collection_name: str,
+    profile_name: str,
+    profile_in: SearchProfile,
+    admin: User = Depends(get_admin_user)
+) -> Any:
+    """新增或替换集合的命名查询参数配置，查询时通过search_profile选择"""
+    try:
+        return save_search_profile(
+            connection_id, collection_name, profile_name, profile_to_search_params(profile_in.dict())
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.delete("/connections/{connection_id}/search-profiles/{collection_name}/{profile_name}", response_model=Dict[str, bool])
+async def remove_search_profile(
+    connection_id: str,
+    collection_name: str,
+    profile_name: str,
+    admin: User = Depends(get_admin_user)
+) -> Any:
+    """删除集合的命名查询参数配置"""
+    try:
+        success = delete_search_profile(connection_id, collection_name, profile_name)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="配置不存在"
+        )
+    return {"success": True}
+
+@router.put("/connections/{connection_id}/search-profiles/{collection_name}", response_model=Dict[str, Any])
+async def put_default_search_profile(
+    connection_id: str,
+    collection_name: str,
+    default: Optional[str] = None,
+    admin: User = Depends(get_admin_user)
+) -> Any:
+    """设置集合的默认配置(可为recommended)，未指定配置和search_params的查询自动使用；default为空时取消"""
+    try:
+        return set_default_search_profile(connection_id, collection_name, default)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/pool", response_model=Dict[str, Any])
+async def get_connection_pool_stats(admin: User = Depends(get_admin_user)) -> Any:
+    """获取连接池使用情况"""
+    return connection_manager.stats()
+
+@router.get("/loaded-collections", response_model=Dict[str, Any])
+async def get_loaded_collections(admin: User = Depends(get_admin_user)) -> Any:
+    """获取已加载集合的命中与淘汰统计"""
+    return collection_registry.stats()
+
+@router.get("/local-collections", response_model=Dict[str, Any])
+async def get_local_collections(admin: User = Depends(get_admin_user)) -> Any:
+    """获取本地引擎已打开的集合"""
+    return local_engine.stats()
+
+@router.get("/collection-cache", response_model=Dict[str, Any])
+async def get_collection_cache(admin: User = Depends(get_admin_user)) -> Any:
+    """获取缓存的集合结构信息"""
+    return collection_cache.stats()
+
+@router.delete("/collection-cache", response_model=Dict[str, bool])
+async def invalidate_collection_cache(
+    database_id: str,
+    collection_name: Optional[str] = None,
+    admin: User = Depends(get_admin_user)
+) -> Any:
+    """集合被删除或修改后清除缓存的结构信息及查询结果"""
+    collection_cache.invalidate(database_id, collection_name)
+    result_cache.invalidate(database_id, collection_name)
+    return {"success": True}
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from typing import Any, List, Dict, Optional, Union
-import json
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Header
+from fastapi.responses import StreamingResponse
+from typing import Any, List, Dict, Generator, Iterator, Optional, Union
+import asyncio
+import os
+import threading
 
 from schemas.user import User
 from schemas.query import (
@@ -8,29 +11,69 @@ from schemas.query import (
     TextToVectorQuery,
     QueryResult,
     MultiDatabaseQuery,
-    MultiDatabaseQueryResult
+    MultiDatabaseQueryResult,
+    SearchParamsEvaluation,
+    SearchParamsEvaluationResult
 )
-from core.security import get_current_user
-from services.query import execute_vector_query, execute_multi_db_query
+from core.config import settings
+from core.executors import milvus_executor
+from core.security import get_current_user, get_admin_user
+from services.query import (
+    execute_vector_query,
+    execute_multi_db_query,
+    execute_vector_file_query,
+    iter_multi_db_query
+)
+from services.coalescer import search_coalescer
+from services.evaluation import evaluate_search_params
+from services.result_cache import result_cache
+from services.single_flight import single_flight
+from services.slow_query_log import slow_query_log
+from services.serialization import (
+    EVENT_STREAM_MEDIA_TYPE,
+    NDJSON_MEDIA_TYPE,
+    encode_stream_event,
+    negotiate_format,
+    query_response
+)
+from services.vector_files import detect_vector_format, open_vector_file, spool_upload
 
 router = APIRouter()
 
+def _response_format(accept: Optional[str]) -> str:
+    """根据Accept请求头选择JSON、列式JSON或Arrow IPC响应格式"""
+    try:
+        return negotiate_format(accept)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=str(e)
+        )
+
 @router.post("/vector", response_model=QueryResult)
 async def query_vector(
     query: VectorQuery,
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """执行向量查询"""
+    response_format = _response_format(accept)
     try:
-        result = execute_vector_query(
+        result = await milvus_executor.run(
+            execute_vector_query,
             database_id=query.database_id,
             collection_name=query.collection_name,
             vector_data=query.vector_data,
             top_k=query.top_k,
             search_params=query.search_params,
-            output_fields=query.output_fields
+            search_profile=query.search_profile,
+            output_fields=query.output_fields,
+            anns_field=query.anns_field,
+            use_cache=query.use_cache,
+            profile=query.profile,
+            user=current_user.username
         )
-        return result
+        return query_response(result, response_format)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -40,55 +83,255 @@ async def query_vector(
 @router.post("/multi", response_model=MultiDatabaseQueryResult)
 async def query_multiple_databases(
     query: MultiDatabaseQuery,
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """在多个数据库上执行查询"""
+    response_format = _response_format(accept)
     try:
-        result = execute_multi_db_query(
+        result = await milvus_executor.run(
+            execute_multi_db_query,
             database_ids=query.database_ids,
             collection_names=query.collection_names,
             vector_data=query.vector_data,
             top_k=query.top_k,
             search_params=query.search_params,
-            output_fields=query.output_fields
+            search_profile=query.search_profile,
+            output_fields=query.output_fields,
+            anns_field=query.anns_field,
+            use_cache=query.use_cache,
+            timeout=query.timeout,
+            database_timeouts=query.database_timeouts,
+            profile=query.profile,
+            user=current_user.username
         )
-        print("route:query_multiple_databases")
-        print(result)
-        return result
+        return query_response(result, response_format)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
+@router.post("/multi/stream")
+async def stream_multiple_databases(
+    query: MultiDatabaseQuery,
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """在多个数据库上执行查询，按完成顺序流式返回结果
+
+    每个数据库完成后立即返回其结果(database)或错误(error)，随后返回已完成数据库的
+    合并top_k(partial)，最后返回与/multi相同的完整结果(final)。
+    默认以NDJSON格式返回，Accept为text/event-stream时以SSE格式返回。
+    """
+    sse = EVENT_STREAM_MEDIA_TYPE in (accept or "")
+    events = iter_multi_db_query(
+        database_ids=query.database_ids,
+        collection_names=query.collection_names,
+        vector_data=query.vector_data,
+        top_k=query.top_k,
+        search_params=query.search_params,
+        search_profile=query.search_profile,
+        output_fields=query.output_fields,
+        anns_field=query.anns_field,
+        use_cache=query.use_cache,
+        timeout=query.timeout,
+        database_timeouts=query.database_timeouts,
+        progressive=True,
+        profile=query.profile,
+        user=current_user.username
+    )
+    # 生成器在线程池中推进，加锁保证客户端断开时的关闭操作不与正在执行的next()并发
+    lock = threading.Lock()
+    try:
+        # 先取第一个事件，请求参数无效时仍可返回400
+        first_event = await milvus_executor.run(_next_event, events, lock)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    async def event_stream():
+        event = first_event
+        try:
+            while event is not None:
+                yield encode_stream_event(event, sse)
+                event = await milvus_executor.run(_next_event, events, lock)
+        finally:
+            asyncio.ensure_future(milvus_executor.run(_close_events, events, lock))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type=EVENT_STREAM_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE
+    )
+
+def _next_event(events: Iterator[Dict[str, Any]], lock: threading.Lock) -> Optional[Dict[str, Any]]:
+    with lock:
+        return next(events, None)
+
+def _close_events(events: Generator, lock: threading.Lock) -> None:
+    with lock:
+        events.close()
+
 @router.post("/upload-vector", response_model=QueryResult)
 async def query_with_uploaded_vector(
     database_id: str = Form(...),
     collection_name: str = Form(...),
     top_k: int = Form(10),
     vector_file: UploadFile = File(...),
+    vector_format: Optional[str] = Form(None),
+    dim: Optional[int] = Form(None),
+    dtype: str = Form("float32"),
+    batch_size: int = Form(settings.UPLOAD_QUERY_BATCH_SIZE),
+    search_profile: Optional[str] = Form(None),
+    profile: bool = Form(False),
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user)
 ) -> Any:
-    """通过上传向量文件进行查询"""
+    """通过上传向量文件进行查询
+
+    支持JSON、.npy、.fvecs以及指定维度的小端float32/float16原始二进制文件，
+    文件先写入磁盘再以内存映射方式按批次查询。
+    """
+    response_format = _response_format(accept)
+    path = None
     try:
-        # 读取上传的向量文件
-        vector_data = json.loads(await vector_file.read())
+        vector_format = detect_vector_format(vector_file.filename, vector_format)
+        # 将上传文件写入磁盘，避免整个文件留在内存中
+        path = await spool_upload(vector_file)
         
         # 执行查询
-        result = execute_vector_query(
+        result = await milvus_executor.run(
+            _query_vector_file,
+            path=path,
+            vector_format=vector_format,
+            dim=dim,
+            dtype=dtype,
             database_id=database_id,
             collection_name=collection_name,
-            vector_data=vector_data,
-            top_k=top_k
+            top_k=top_k,
+            batch_size=batch_size,
+            search_profile=search_profile,
+            profile=profile,
+            user=current_user.username
         )
-        return result
-    except json.JSONDecodeError:
+        return query_response(result, response_format)
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="无效的向量文件格式，请提供有效的JSON"
+            detail=str(e)
+        )
+    finally:
+        if path:
+            os.unlink(path)
+
+def _query_vector_file(path: str, vector_format: str, dim: Optional[int], dtype: str, **query_args: Any) -> QueryResult:
+    """以内存映射方式打开向量文件并按批次查询"""
+    vectors = open_vector_file(path, vector_format, dim=dim, dtype=dtype)
+    return execute_vector_file_query(vectors=vectors, **query_args)
+
+@router.post("/evaluate", response_model=SearchParamsEvaluationResult)
+async def evaluate_collection_search_params(
+    evaluation: SearchParamsEvaluation,
+    admin: User = Depends(get_admin_user)
+) -> Any:
+    """以精确真值评估候选查询参数的召回率与延迟，返回帕累托表及推荐参数"""
+    try:
+        return await milvus_executor.run(
+            evaluate_search_params,
+            database_id=evaluation.database_id,
+            collection_name=evaluation.collection_name,
+            anns_field=evaluation.anns_field,
+            top_k=evaluation.top_k,
+            vector_data=evaluation.vector_data,
+            sample_size=evaluation.sample_size,
+            candidates=evaluation.candidates,
+            repeats=evaluation.repeats,
+            target_recall=evaluation.target_recall,
+            save=evaluation.save,
+            seed=evaluation.seed,
+            user=admin.username
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/cache", response_model=Dict[str, Any])
+async def get_query_cache_stats(admin: User = Depends(get_admin_user)) -> Any:
+    """获取查询结果缓存的统计信息"""
+    return result_cache.stats()
+
+@router.delete("/cache", response_model=Dict[str, int])
+async def invalidate_query_cache(
+    database_id: Optional[str] = None,
+    collection_name: Optional[str] = None,
+    admin: User = Depends(get_admin_user)
+) -> Any:
+    """清除查询结果缓存，可按数据库或集合清除"""
+    return {"invalidated": result_cache.invalidate(database_id, collection_name)}
+
+@router.get("/coalescer", response_model=Dict[str, Any])
+async def get_coalescer_stats(admin: User = Depends(get_admin_user)) -> Any:
+    """获取查询合并的批次数、合并的请求数与平均批次大小"""
+    return search_coalescer.stats()
+
+@router.get("/single-flight", response_model=Dict[str, Any])
+async def get_single_flight_stats(admin: User = Depends(get_admin_user)) -> Any:
+    """获取相同进行中查询的合并情况"""
+    return single_flight.stats()
+
+@router.get("/slow-log", response_model=List[Dict[str, Any]])
+async def get_slow_queries(
+    user: Optional[str] = None,
+    database_id: Optional[str] = None,
+    collection_name: Optional[str] = None,
+    kind: Optional[str] = None,
+    min_duration: Optional[float] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = 100,
+    admin: User = Depends(get_admin_user)
+) -> Any:
+    """按用户、数据库、集合、耗时或时间范围筛选慢查询记录，最新的在前"""
+    return await milvus_executor.run(
+        slow_query_log.search,
+        user=user,
+        database_id=database_id,
+        collection_name=collection_name,
+        kind=kind,
+        min_duration=min_duration,
+        since=since,
+        until=until,
+        limit=limit
+    )
+
+@router.get("/slow-log/summary", response_model=List[Dict[str, Any]])
+async def summarize_slow_queries(
+    group_by: str = "collection",
+    stage: Optional[str] = "search",
+    since: Optional[float] = None,
+    limit: int = 10,
+    admin: User = Depends(get_admin_user)
+) -> Any:
+    """聚合慢查询，例如按集合统计累计查询(search阶段)耗时最高的集合；stage为空时按总耗时"""
+    try:
+        return await milvus_executor.run(
+            slow_query_log.summarize,
+            group_by=group_by,
+            stage=stage or None,
+            since=since,
+            limit=limit
         )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
+
+@router.get("/slow-log/stats", response_model=Dict[str, Any])
+async def get_slow_query_log_stats(admin: User = Depends(get_admin_user)) -> Any:
+    """慢查询日志的写入情况"""
+    return slow_query_log.stats()
@@ -1,32 +1,79 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator, root_validator
 from typing import Optional, List, Dict, Any
 
+# 连接类型：milvus为Milvus服务，local为本地.npy向量目录
+ENGINE_TYPES = ("milvus", "local")
+
 class DatabaseConnection(BaseModel):
     id: str
     name: str
-    host: str
-    port: int
+    engine: str = "milvus"
+    host: Optional[str] = None
+    port: Optional[int] = None
+    path: Optional[str] = None  # 本地引擎的数据目录
     username: Optional[str] = None
     password: Optional[str] = None
     description: Optional[str] = None
     status: Optional[str] = "未连接"
     created_by: str
+    max_loaded_collections: Optional[int] = None  # 同时加载的集合数量上限，为空时使用系统配置
+    loaded_memory_budget_mb: Optional[int] = None  # 已加载集合的内存预算(MB)，为空时使用系统配置
+    # 集合名称到查询参数评估推荐结果的映射
+    recommended_search_params: Optional[Dict[str, Dict[str, Any]]] = None
+    # 按集合(或"*"表示所有集合)保存的命名查询参数配置: {"profiles": {名称: 参数}, "default": 名称}
+    search_profiles: Optional[Dict[str, Dict[str, Any]]] = None
     
 class DatabaseConnectionCreate(BaseModel):
     name: str
-    host: str
-    port: int
+    engine: str = "milvus"
+    host: Optional[str] = None
+    port: Optional[int] = None
+    path: Optional[str] = None
     username: Optional[str] = None
     password: Optional[str] = None
     description: Optional[str] = None
+    max_loaded_collections: Optional[int] = None
+    loaded_memory_budget_mb: Optional[int] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_engine(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Milvus连接需要host和port，本地引擎需要数据目录"""
+        engine = values.get("engine")
+        if engine not in ENGINE_TYPES:
+            raise ValueError(f"不支持的连接类型: {engine}，支持: {', '.join(ENGINE_TYPES)}")
+        if engine == "local" and not values.get("path"):
+            raise ValueError("本地引擎需要指定数据目录path")
+        if engine == "milvus" and (not values.get("host") or values.get("port") is None):
+            raise ValueError("Milvus连接需要指定host和port")
+        return values
 
 class DatabaseConnectionUpdate(BaseModel):
     name: Optional[str] = None
     host: Optional[str] = None
     port: Optional[int] = None
+    path: Optional[str] = None
     username: Optional[str] = None
     password: Optional[str] = None
     description: Optional[str] = None
+    max_loaded_collections: Optional[int] = None
+    loaded_memory_budget_mb: Optional[int] = None
+
+# Milvus支持的一致性级别
+CONSISTENCY_LEVELS = ("Strong", "Session", "Bounded", "Eventually")
+
+class SearchProfile(BaseModel):
+    """命名的查询参数配置，如fast、balanced、accurate"""
+    metric_type: Optional[str] = None  # 为空时使用索引的度量类型
+    nprobe: Optional[int] = Field(None, gt=0)  # IVF类索引
+    ef: Optional[int] = Field(None, gt=0)  # HNSW索引
+    params: Optional[Dict[str, Any]] = None  # 其他索引查询参数
+    consistency_level: Optional[str] = None
+
+    @validator("consistency_level")
+    def check_consistency_level(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and value not in CONSISTENCY_LEVELS:
+            raise ValueError(f"不支持的一致性级别: {value}，支持: {', '.join(CONSISTENCY_LEVELS)}")
+        return value
 
 class DatabaseStatus(BaseModel):
     id: str
@@ -42,4 +89,5 @@ class Collection(BaseModel):
 class DatabaseStatistics(BaseModel):
     collection_count: int
     total_entities: int
-    collections: List[Collection] 
\ No newline at end of file
+    collections: List[Collection]
+    collected_at: Optional[float] = None  # 统计信息的收集时间(Unix时间戳) 
\ No newline at end of file
@@ -1,13 +1,95 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any, Union
+import base64
+import binascii
+import numpy as np
+from pydantic import BaseModel, Field, validator, root_validator
+from typing import Optional, List, Dict, Any
+from core.config import settings
 
-class VectorQuery(BaseModel):
+# base64编码向量支持的数据类型(小端)
+VECTOR_B64_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2")
+}
+
+def _as_vector_array(value: Any) -> np.ndarray:
+    """将JSON数组形式的向量整体转换为NumPy数组，代替逐个元素的校验"""
+    try:
+        vectors = np.asarray(value, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise ValueError("向量数据必须是数值列表或数值列表的列表")
+    if vectors.ndim not in (1, 2) or vectors.size == 0:
+        raise ValueError("向量数据必须是非空的一维或二维数组")
+    if not np.isfinite(vectors).all():
+        raise ValueError("向量数据包含无效数值")
+    return vectors
+
+def _decode_b64_vectors(data: str, dtype: str, shape: Optional[List[int]]) -> np.ndarray:
+    """解码base64编码的向量，NumPy数组直接引用解码后的字节，不做额外复制"""
+    if dtype not in VECTOR_B64_DTYPES:
+        raise ValueError(f"不支持的向量数据类型: {dtype}，支持: {', '.join(VECTOR_B64_DTYPES)}")
+    if not shape or len(shape) not in (1, 2) or any(size <= 0 for size in shape):
+        raise ValueError("使用vector_b64时必须提供有效的vector_shape，如[nq, dim]或[dim]")
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("vector_b64不是有效的base64数据")
+    item_size = VECTOR_B64_DTYPES[dtype].itemsize
+    if len(raw) != int(np.prod(shape)) * item_size:
+        raise ValueError(f"vector_b64的长度 {len(raw)} 字节与形状 {shape} 的 {dtype} 数据不一致")
+    vectors = np.frombuffer(raw, dtype=VECTOR_B64_DTYPES[dtype]).reshape(shape)
+    if not np.isfinite(vectors).all():
+        raise ValueError("向量数据包含无效数值")
+    return vectors
+
+def _check_timeout(value: float) -> float:
+    """查询超时必须为正数且不超过系统配置的上限"""
+    if value <= 0:
+        raise ValueError("查询超时必须大于0")
+    if value > settings.MULTI_DB_MAX_QUERY_TIMEOUT:
+        raise ValueError(f"查询超时不能超过 {settings.MULTI_DB_MAX_QUERY_TIMEOUT} 秒")
+    return value
+
+class VectorPayload(BaseModel):
+    """查询向量，可以是JSON数组，也可以是带形状的base64编码二进制数据"""
+    vector_data: Optional[Any] = Field(
+        None, description="单个向量(List[float])或向量列表(List[List[float]])"
+    )
+    vector_b64: Optional[str] = Field(
+        None, description="base64编码的小端float32/float16向量数据，需同时提供vector_shape"
+    )
+    vector_dtype: str = "float32"
+    vector_shape: Optional[List[int]] = None  # [nq, dim]或[dim]
+
+    @validator("vector_data", pre=True)
+    def parse_vector_data(cls, value: Any) -> Any:
+        if value is None:
+            return None
+        return _as_vector_array(value)
+
+    @root_validator(skip_on_failure=True)
+    def decode_vector_b64(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        if values.get("vector_b64") is not None:
+            if values.get("vector_data") is not None:
+                raise ValueError("vector_data和vector_b64只能提供一个")
+            values["vector_data"] = _decode_b64_vectors(
+                values["vector_b64"], values.get("vector_dtype"), values.get("vector_shape")
+            )
+            # 解码后不再保留base64字符串
+            values["vector_b64"] = None
+        elif values.get("vector_data") is None:
+            raise ValueError("必须提供vector_data或vector_b64")
+        return values
+
+class VectorQuery(VectorPayload):
     database_id: str
     collection_name: str
-    vector_data: Union[List[float], List[List[float]]]
     top_k: int = 10
     search_params: Optional[Dict[str, Any]] = None
+    search_profile: Optional[str] = None  # 使用集合的命名查询参数配置，search_params中的参数覆盖配置
     output_fields: Optional[List[str]] = None
+    anns_field: Optional[str] = None  # 查询的向量字段，默认使用集合的第一个向量字段
+    use_cache: bool = True  # 启用结果缓存时，是否允许使用缓存结果
+    profile: bool = False  # 是否在metrics中返回分阶段耗时
     
 class TextToVectorQuery(BaseModel):
     database_id: str
@@ -29,17 +111,70 @@ class QueryResult(BaseModel):
     database_id: str
     collection_name: str
     results: List[Dict[str, Any]]
+    # 批量查询(nq > 1)时按查询向量分组的结果，此时results为空
+    batch_results: Optional[List[List[Dict[str, Any]]]] = None
     metrics: Dict[str, Any]
     
-class MultiDatabaseQuery(BaseModel):
+class MultiDatabaseQuery(VectorPayload):
     database_ids: List[str]
     collection_names: Dict[str, str]  # 数据库ID到集合名称的映射
-    vector_data: Union[List[float], List[List[float]]]
     top_k: int = 10
     search_params: Optional[Dict[str, Any]] = None
+    search_profile: Optional[str] = None  # 各数据库分别解析同名的查询参数配置
     output_fields: Optional[List[str]] = None
+    anns_field: Optional[str] = None  # 查询的向量字段，默认使用各集合的第一个向量字段
+    use_cache: bool = True  # 启用结果缓存时，是否允许使用缓存结果
+    profile: bool = False  # 是否在metrics中返回分阶段耗时
+    timeout: Optional[float] = None  # 每个数据库的查询超时(秒)，默认使用系统配置
+    database_timeouts: Optional[Dict[str, float]] = None  # 数据库ID到超时时间的映射，覆盖timeout
+
+    @validator("timeout")
+    def check_timeout(cls, value: Optional[float]) -> Optional[float]:
+        return _check_timeout(value) if value is not None else None
+
+    @validator("database_timeouts")
+    def check_database_timeouts(cls, value: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+        if value is not None:
+            for timeout in value.values():
+                _check_timeout(timeout)
+        return value
     
 class MultiDatabaseQueryResult(BaseModel):
     results: Dict[str, QueryResult]  # 数据库ID到查询结果的映射
     aggregated_results: List[Dict[str, Any]]
-    metrics: Dict[str, Any] 
\ No newline at end of file
+    # 批量查询(nq > 1)时每个查询向量各自跨数据库合并的top_k结果，此时aggregated_results为空
+    batch_aggregated_results: Optional[List[List[Dict[str, Any]]]] = None
+    metrics: Dict[str, Any]
+
+class SearchParamsEvaluation(BaseModel):
+    """查询参数评估：用精确真值衡量各候选search_params的召回率与延迟"""
+    database_id: str
+    collection_name: str
+    anns_field: Optional[str] = None
+    top_k: int = Field(10, gt=0)
+    # 评估用的查询向量，不提供时从集合已存储的向量中随机抽取sample_size个
+    vector_data: Optional[Any] = None
+    sample_size: int = Field(100, gt=0)
+    # 候选查询参数，如[{"params": {"nprobe": 8}}, {"params": {"nprobe": 32}}]，不提供时按索引类型生成
+    candidates: Optional[List[Dict[str, Any]]] = None
+    repeats: int = Field(1, gt=0)  # 每个查询向量在每组参数下重复计时的次数
+    target_recall: float = Field(0.95, gt=0, le=1)  # 推荐满足该召回率且p99延迟最低的参数
+    save: bool = True  # 是否将推荐参数保存到数据库连接
+    seed: Optional[int] = None
+
+    @validator("vector_data", pre=True)
+    def parse_vector_data(cls, value: Any) -> Any:
+        if value is None:
+            return None
+        return _as_vector_array(value)
+
+class SearchParamsEvaluationResult(BaseModel):
+    database_id: str
+    collection_name: str
+    top_k: int
+    sample_size: int
+    base_size: int  # 计算真值时扫描的已存储向量数
+    ground_truth_time: float
+    # 每组参数一行: search_params、recall、p50_ms、p99_ms、mean_ms、pareto、error，按p99升序
+    table: List[Dict[str, Any]]
+    recommended: Optional[Dict[str, Any]] = None
@@ -0,0 +1,121 @@
+import threading
+from typing import List, Dict, Any, Callable, Hashable, Tuple
+import numpy as np
+from core.config import settings
+from core.metrics import registry
+
+
+class _Batch:
+    """一个正在收集中的批次，第一个加入的请求作为leader执行查询"""
+
+    def __init__(self):
+        self.vectors: List[np.ndarray] = []
+        self.size = 0
+        self.requests = 0
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.result: List[Any] = []
+        self.error: Any = None
+
+
+class SearchCoalescer:
+    """把相同参数的并发查询合并为一次nq批量查询
+
+    同一个键(数据库、集合、向量字段、查询参数、top_k、输出字段)下，第一个请求成为leader，
+    等待window秒或凑满max_vectors个向量后，用所有请求的向量执行一次查询，再把结果按各请求的位置切分返回。
+    其余请求只等待leader完成，不单独访问服务端。
+    """
+
+    def __init__(self, enabled: bool, window: float, max_vectors: int):
+        self.enabled = enabled
+        self.window = window
+        self.max_vectors = max(1, max_vectors)
+        self._open: Dict[Hashable, _Batch] = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.vectors = 0
+
+    def search(
+        self,
+        key: Hashable,
+        vectors: np.ndarray,
+        execute: Callable[[np.ndarray], Any]
+    ) -> Tuple[List[Any], int]:
+        """返回本请求各查询向量的结果，以及合并执行的请求数(未合并时为1)"""
+        if not self.enabled or len(vectors) >= self.max_vectors:
+            return list(execute(vectors)), 1
+
+        with self._lock:
+            batch = self._open.get(key)
+            if batch is not None and batch.size + len(vectors) > self.max_vectors:
+                # 放不下时立即发送当前批次，本请求开始新的批次
+                batch.full.set()
+                del self._open[key]
+                batch = None
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            offset = batch.size
+            batch.vectors.append(vectors)
+            batch.size += len(vectors)
+            batch.requests += 1
+            if batch.size >= self.max_vectors:
+                batch.full.set()
+                if self._open.get(key) is batch:
+                    del self._open[key]
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+                self.batches += 1
+                self.requests += batch.requests
+                self.vectors += batch.size
+            if batch.requests > 1:
+                coalesced_batches.inc()
+            # 拼接或查询出错时异常同样交给等待中的请求，保证它们总能被唤醒
+            try:
+                data = np.concatenate(batch.vectors) if len(batch.vectors) > 1 else batch.vectors[0]
+                batch.result = list(execute(data))
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            coalesced_requests.inc()
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result[offset:offset + len(vectors)], batch.requests
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window": self.window,
+                "max_vectors": self.max_vectors,
+                "batches": self.batches,
+                "requests": self.requests,
+                "vectors": self.vectors,
+                "open_batches": len(self._open),
+                "avg_requests_per_batch": self.requests / self.batches if self.batches else 0.0
+            }
+
+
+search_coalescer = SearchCoalescer(
+    enabled=settings.QUERY_COALESCE_ENABLED,
+    window=settings.QUERY_COALESCE_WINDOW_MS / 1000.0,
+    max_vectors=settings.QUERY_COALESCE_MAX_VECTORS
+)
+
+coalesced_requests = registry.counter(
+    "fedui_coalesced_requests_total",
+    "Vector queries that joined another query's batched search instead of issuing their own"
+)
+coalesced_batches = registry.counter(
+    "fedui_coalesced_batches_total",
+    "Batched searches executed by the query coalescer that combined more than one query"
+)
@@ -0,0 +1,152 @@
+import re
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from pymilvus import Collection, DataType
+from core.config import settings
+
+VECTOR_DATA_TYPES = (DataType.FLOAT_VECTOR, DataType.BINARY_VECTOR)
+
+
+class CollectionInfo:
+    """缓存的集合结构信息及按连接别名复用的集合句柄"""
+
+    def __init__(self, database_id: str, name: str, collection: Collection):
+        self.database_id = database_id
+        self.name = name
+        self.fetched_at = time.time()
+        self.primary_field: Optional[str] = None
+        self.primary_field_dtype: Optional[int] = None
+        self.vector_fields: Dict[str, Dict[str, Any]] = {}
+        self.handles: Dict[str, Collection] = {}
+
+        for field in collection.schema.fields:
+            if getattr(field, "is_primary", False):
+                self.primary_field = field.name
+                self.primary_field_dtype = field.dtype
+            if field.dtype in VECTOR_DATA_TYPES:
+                self.vector_fields[field.name] = {
+                    "dim": int(field.params.get("dim", 0)),
+                    "binary": field.dtype == DataType.BINARY_VECTOR,
+                    "metric_type": None,
+                    "index_type": None
+                }
+
+        for index in collection.indexes:
+            field_info = self.vector_fields.get(index.field_name)
+            if field_info is not None:
+                params = index.params
+                field_info["metric_type"] = params.get("metric_type")
+                field_info["index_type"] = params.get("index_type")
+
+    @property
+    def default_vector_field(self) -> Optional[str]:
+        """默认使用第一个向量字段"""
+        return next(iter(self.vector_fields), None)
+
+    def vector_field(self, anns_field: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """返回要查询的向量字段名称及其信息"""
+        name = anns_field or self.default_vector_field
+        if name is None:
+            raise ValueError(f"集合 {self.name} 中没有向量字段")
+        if name not in self.vector_fields:
+            raise ValueError(f"集合 {self.name} 中不存在向量字段 {name}，可用字段: {list(self.vector_fields)}")
+        return name, self.vector_fields[name]
+
+    def validate_dimension(self, vectors: np.ndarray, anns_field: Optional[str] = None) -> None:
+        """在发送查询前校验(nq × dim)查询向量的维度"""
+        name, field_info = self.vector_field(anns_field)
+        dim = field_info["dim"]
+        if not dim or field_info["binary"]:
+            return
+        if vectors.shape[1] != dim:
+            raise ValueError(f"查询向量维度为 {vectors.shape[1]}，但字段 {name} 的维度为 {dim}")
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "primary_field": self.primary_field,
+            "vector_fields": self.vector_fields,
+            "fetched_at": self.fetched_at
+        }
+
+
+class CollectionCache:
+    """按(数据库ID, 集合名称)缓存集合句柄和结构信息，避免每次查询都向服务端获取schema"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], CollectionInfo] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, database_id: str, alias: str, collection_name: str) -> Tuple[CollectionInfo, Collection]:
+        """返回集合信息和绑定到指定连接别名的集合句柄"""
+        key = (database_id, collection_name)
+        with self._lock:
+            info = self._entries.get(key)
+            if info and self.ttl and time.time() - info.fetched_at > self.ttl:
+                del self._entries[key]
+                info = None
+            handle = info.handles.get(alias) if info else None
+            if handle is not None:
+                self.hits += 1
+                return info, handle
+            self.misses += 1
+
+        handle = Collection(collection_name, using=alias)
+        if info is None:
+            info = CollectionInfo(database_id, collection_name, handle)
+        with self._lock:
+            info = self._entries.setdefault(key, info)
+            info.handles[alias] = handle
+        return info, handle
+
+    def invalidate(self, database_id: str, collection_name: Optional[str] = None) -> None:
+        """集合被删除或修改后清除缓存，collection_name为空时清除整个数据库"""
+        with self._lock:
+            if collection_name is not None:
+                self._entries.pop((database_id, collection_name), None)
+                return
+            for key in [key for key in self._entries if key[0] == database_id]:
+                del self._entries[key]
+
+    def retain(self, database_id: str, collection_names: List[str]) -> None:
+        """只保留服务端仍然存在的集合"""
+        existing = set(collection_names)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == database_id and key[1] not in existing]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "collections": [
+                    {"database_id": database_id, **info.describe()}
+                    for (database_id, _), info in self._entries.items()
+                ]
+            }
+
+
+# Milvus表示集合不存在的错误码：2.2的CollectionNotExists及2.3起的ErrCollectionNotFound
+_COLLECTION_NOT_FOUND_CODES = (4, 100)
+# 只匹配集合不存在或结构不一致的错误，输出字段、过滤表达式写错等请求错误不应清除缓存
+_SCHEMA_ERROR_PATTERN = re.compile(
+    r"can't find collection|collection not found|collection \S+ (does )?not exist|schema mismatch"
+)
+
+
+def is_schema_error(error: Exception) -> bool:
+    """判断异常是否说明缓存的集合结构已失效(集合被删除、重建或结构变化)"""
+    if getattr(error, "code", None) in _COLLECTION_NOT_FOUND_CODES:
+        return True
+    return _SCHEMA_ERROR_PATTERN.search(str(error).lower()) is not None
+
+
+collection_cache = CollectionCache(ttl=settings.COLLECTION_SCHEMA_TTL)
@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator, Tuple
+from pymilvus import Collection, utility
+from core.config import settings
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class LoadedCollection:
+    """已加载到查询节点内存中的集合"""
+
+    def __init__(self, name: str, memory_bytes: int):
+        self.name = name
+        self.memory_bytes = memory_bytes
+        self.pins = 0
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
+
+class LoadedCollectionRegistry:
+    """记录每个数据库中已加载的集合
+
+    已加载的集合跳过重复的load()调用；超过数量上限或内存预算时，
+    释放最久未被查询且当前没有查询在使用的集合。
+    """
+
+    def __init__(self, max_collections: int, memory_budget_mb: int):
+        self.max_collections = max_collections
+        self.memory_budget_mb = memory_budget_mb
+        self._databases: Dict[str, "OrderedDict[str, LoadedCollection]"] = {}
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def pin(
+        self,
+        connection: Dict[str, Any],
+        alias: str,
+        collection: Collection,
+        timeout: Optional[float] = None
+    ) -> Iterator[bool]:
+        """确保集合已加载并在使用期间防止其被释放，返回是否命中已加载记录
+
+        timeout限制等待其他请求完成加载及本次load()的总时间。
+        """
+        database_id = connection["id"]
+        hit = self._pin_loaded(database_id, collection.name)
+        if not hit:
+            self._load(connection, alias, collection, timeout)
+        try:
+            yield hit
+        finally:
+            with self._lock:
+                entry = self._databases.get(database_id, {}).get(collection.name)
+                if entry:
+                    entry.pins -= 1
+
+    def forget(self, database_id: str, collection_name: Optional[str] = None) -> None:
+        """移除加载记录(集合被外部释放、删除，或连接被断开时调用)"""
+        with self._lock:
+            if collection_name is None:
+                self._databases.pop(database_id, None)
+            else:
+                self._databases.get(database_id, OrderedDict()).pop(collection_name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率、淘汰次数及各数据库已加载的集合"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "databases": {
+                    database_id: {
+                        "loaded_count": len(loaded),
+                        "memory_bytes": sum(entry.memory_bytes for entry in loaded.values()),
+                        "collections": [
+                            {
+                                "name": entry.name,
+                                "memory_bytes": entry.memory_bytes,
+                                "in_use": entry.pins,
+                                "last_used": entry.last_used
+                            }
+                            for entry in loaded.values()
+                        ]
+                    }
+                    for database_id, loaded in self._databases.items()
+                }
+            }
+
+    def _pin_loaded(self, database_id: str, collection_name: str) -> bool:
+        with self._lock:
+            loaded = self._databases.get(database_id)
+            entry = loaded.get(collection_name) if loaded else None
+            if entry is None:
+                self.misses += 1
+                return False
+            entry.pins += 1
+            entry.last_used = time.time()
+            loaded.move_to_end(collection_name)
+            self.hits += 1
+            return True
+
+    def _load(
+        self,
+        connection: Dict[str, Any],
+        alias: str,
+        collection: Collection,
+        timeout: Optional[float] = None
+    ) -> None:
+        """加载集合并登记，同一集合的并发加载只执行一次"""
+        database_id = connection["id"]
+        key = (database_id, collection.name)
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        # 其他请求正在加载同一集合时等待其完成，最多等待到截止时间
+        if not load_lock.acquire(timeout=-1 if deadline is None else max(0.0, deadline - time.time())):
+            raise ValueError(f"等待集合 {collection.name} 加载超时")
+        try:
+            with self._lock:
+                entry = self._databases.get(database_id, {}).get(collection.name)
+                if entry:
+                    entry.pins += 1
+                    entry.last_used = time.time()
+                    return
+
+            try:
+                if deadline is None:
+                    collection.load()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise ValueError(f"等待集合 {collection.name} 加载超时")
+                    collection.load(timeout=remaining)
+                entry = LoadedCollection(collection.name, self._memory_usage(alias, collection.name))
+                entry.pins = 1
+                with self._lock:
+                    self._databases.setdefault(database_id, OrderedDict())[collection.name] = entry
+                    victims = self._select_victims(connection)
+                    self.evictions += len(victims)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        finally:
+            load_lock.release()
+
+        for name in victims:
+            try:
+                Collection(name, using=alias).release()
+                logger.info(f"已释放数据库 {database_id} 中最久未使用的集合 {name}")
+            except Exception as e:
+                logger.warning(f"释放集合 {name} 时出错: {e}")
+
+    def _select_victims(self, connection: Dict[str, Any]) -> list:
+        """按LRU顺序挑选需要释放的集合，正在使用的集合不会被释放(调用时需持有锁)"""
+        loaded = self._databases[connection["id"]]
+        max_collections = connection.get("max_loaded_collections") or self.max_collections
+        budget_mb = connection.get("loaded_memory_budget_mb") or self.memory_budget_mb
+        budget_bytes = budget_mb * 1024 * 1024
+
+        def over_limit() -> bool:
+            if max_collections and len(loaded) > max_collections:
+                return True
+            if budget_bytes and sum(entry.memory_bytes for entry in loaded.values()) > budget_bytes:
+                return True
+            return False
+
+        victims = []
+        for name in list(loaded):
+            if not over_limit():
+                break
+            if loaded[name].pins == 0:
+                del loaded[name]
+                victims.append(name)
+        return victims
+
+    @staticmethod
+    def _memory_usage(alias: str, collection_name: str) -> int:
+        """查询集合在查询节点上占用的内存字节数"""
+        try:
+            segments = utility.get_query_segment_info(collection_name, using=alias)
+            return sum(getattr(segment, "mem_size", 0) for segment in segments)
+        except Exception as e:
+            logger.warning(f"获取集合 {collection_name} 内存占用时出错: {e}")
+            return 0
+
+
+collection_registry = LoadedCollectionRegistry(
+    max_collections=settings.MILVUS_MAX_LOADED_COLLECTIONS,
+    memory_budget_mb=settings.MILVUS_LOADED_MEMORY_BUDGET_MB
+)
+
+registry.gauge(
+    "fedui_loaded_collections",
+    "Collections loaded into memory per database",
+    ("database",),
+    lambda: [((database_id,), loaded["loaded_count"]) for database_id, loaded in collection_registry.stats()["databases"].items()]
+)
+registry.gauge(
+    "fedui_loaded_collection_bytes",
+    "Estimated memory used by loaded collections per database",
+    ("database",),
+    lambda: [((database_id,), loaded["memory_bytes"]) for database_id, loaded in collection_registry.stats()["databases"].items()]
+)
@@ -0,0 +1,318 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator
+from pymilvus import connections, utility
+from core.config import settings
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class DatabasePool:
+    """单个数据库的连接池状态，每个别名对应一个独立的gRPC通道"""
+
+    def __init__(self, connection: Dict[str, Any], size: int):
+        self.database_id = connection["id"]
+        self.connection = dict(connection)
+        self.aliases = [f"conn_{self.database_id}_{i}" for i in range(size)]
+        self.healthy = {alias: False for alias in self.aliases}
+        self.in_use = {alias: 0 for alias in self.aliases}
+        self.acquired_total = 0
+        self.wait_total = 0  # 没有可用连接、需要等待后台(重)连接的取用次数
+        self.failures = 0
+        self.next_retry_at = 0.0
+        self.last_probe_at = 0.0
+        self.last_error: Optional[str] = None
+        # 防止后台线程与管理操作同时为同一个池建立连接
+        self.connect_lock = threading.Lock()
+
+    def healthy_aliases(self) -> List[str]:
+        return [alias for alias in self.aliases if self.healthy[alias]]
+
+    def needs_reconnect(self) -> bool:
+        return not all(self.healthy.values())
+
+
+class ConnectionManager:
+    """Milvus连接管理器
+
+    为每个数据库维护一组预热的连接，后台线程负责存活探测和带退避的重连，
+    请求路径只从池中取用已建立的连接，不会进行连接握手。
+    """
+
+    def __init__(
+        self,
+        pool_size: int,
+        health_check_interval: float,
+        backoff_min: float,
+        backoff_max: float,
+        connect_timeout: float,
+        acquire_timeout: float
+    ):
+        self.pool_size = max(1, pool_size)
+        self.health_check_interval = health_check_interval
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.acquire_timeout = acquire_timeout
+        self._pools: Dict[str, DatabasePool] = {}
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- 生命周期 ----
+
+    def start(self, connections_data: Optional[List[Dict[str, Any]]] = None) -> None:
+        """启动后台维护线程，并在后台预热所有已配置的数据库连接"""
+        for connection in connections_data or []:
+            self.register(connection)
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="milvus-connection-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台线程并断开所有连接"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.connect_timeout + 1)
+            self._thread = None
+        for database_id in list(self._pools):
+            self.close(database_id)
+
+    # ---- 连接池管理 ----
+
+    def register(self, connection: Dict[str, Any]) -> DatabasePool:
+        """登记数据库连接池，实际连接由后台线程建立"""
+        with self._lock:
+            pool = self._pools.get(connection["id"])
+            if pool is None:
+                pool = DatabasePool(connection, self.pool_size)
+                self._pools[pool.database_id] = pool
+                self._wakeup.set()
+            return pool
+
+    def open(self, connection: Dict[str, Any]) -> bool:
+        """同步建立数据库的全部连接，用于管理操作，返回是否至少有一个连接可用"""
+        pool = self.register(connection)
+        self._connect_pool(pool)
+        return bool(pool.healthy_aliases())
+
+    def reconfigure(self, connection: Dict[str, Any]) -> None:
+        """连接配置变更后，断开旧连接并由后台按新配置重连"""
+        with self._lock:
+            pool = self._pools.get(connection["id"])
+            if pool is None:
+                return
+        self._disconnect_pool(pool)
+        with self._lock:
+            pool.connection = dict(connection)
+            pool.failures = 0
+            pool.next_retry_at = 0.0
+        self._wakeup.set()
+
+    def close(self, database_id: str) -> None:
+        """断开并移除数据库的连接池"""
+        with self._lock:
+            pool = self._pools.pop(database_id, None)
+        if pool:
+            self._disconnect_pool(pool)
+
+    def is_connected(self, database_id: str) -> bool:
+        with self._lock:
+            pool = self._pools.get(database_id)
+            return bool(pool and pool.healthy_aliases())
+
+    @contextmanager
+    def acquire(
+        self,
+        connection: Dict[str, Any],
+        details: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Iterator[str]:
+        """从连接池取出负载最低的可用连接别名
+
+        连接尚未建立时只等待后台线程完成连接，超过acquire_timeout(或更短的timeout)仍不可用则报错。
+        提供details时记录本次是直接复用了已建立的连接，还是等待了后台(重)连接。
+        """
+        pool = self.register(connection)
+        deadline = time.time() + (self.acquire_timeout if timeout is None else min(timeout, self.acquire_timeout))
+        with self._changed:
+            reused = bool(pool.healthy_aliases())
+            if details is not None:
+                details["connection_reused"] = reused
+            if not reused:
+                pool.wait_total += 1
+                self._wakeup.set()
+            while not pool.healthy_aliases():
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._pools.get(pool.database_id) is not pool:
+                    raise ValueError(f"数据库连接不可用，正在后台重连: {pool.last_error or '连接尚未建立'}")
+                self._changed.wait(remaining)
+            alias = min(pool.healthy_aliases(), key=lambda a: pool.in_use[a])
+            pool.in_use[alias] += 1
+            pool.acquired_total += 1
+        try:
+            yield alias
+        except Exception as e:
+            # 连接类错误交给后台探测确认后重连
+            if _is_connection_error(e):
+                self.mark_unhealthy(pool.database_id, alias, str(e))
+            raise
+        finally:
+            with self._lock:
+                pool.in_use[alias] -= 1
+
+    def mark_unhealthy(self, database_id: str, alias: str, error: str) -> None:
+        """将连接标记为不可用，由后台线程重连"""
+        with self._lock:
+            pool = self._pools.get(database_id)
+            if pool and alias in pool.healthy:
+                pool.healthy[alias] = False
+                pool.last_error = error
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池使用情况"""
+        with self._lock:
+            pools = {}
+            for database_id, pool in self._pools.items():
+                healthy = pool.healthy_aliases()
+                in_use = sum(pool.in_use.values())
+                pools[database_id] = {
+                    "name": pool.connection.get("name"),
+                    "size": len(pool.aliases),
+                    "healthy": len(healthy),
+                    "in_use": in_use,
+                    "utilization": in_use / len(pool.aliases),
+                    "acquired_total": pool.acquired_total,
+                    "wait_total": pool.wait_total,
+                    "consecutive_failures": pool.failures,
+                    "last_error": pool.last_error
+                }
+            return {
+                "pool_size": self.pool_size,
+                "health_check_interval": self.health_check_interval,
+                "databases": pools
+            }
+
+    # ---- 后台维护 ----
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=1.0)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            with self._lock:
+                pools = list(self._pools.values())
+            now = time.time()
+            for pool in pools:
+                try:
+                    if pool.needs_reconnect() and now >= pool.next_retry_at:
+                        self._connect_pool(pool)
+                    elif now - pool.last_probe_at >= self.health_check_interval:
+                        self._probe_pool(pool)
+                except Exception as e:
+                    logger.exception(f"维护数据库 {pool.database_id} 的连接池时出错: {e}")
+
+    def _connect_pool(self, pool: DatabasePool) -> None:
+        """为不可用的别名建立连接，失败时按指数退避安排下次重试"""
+        with pool.connect_lock:
+            self._connect_aliases(pool)
+
+    def _connect_aliases(self, pool: DatabasePool) -> None:
+        config = pool.connection
+        for alias in pool.aliases:
+            if pool.healthy[alias]:
+                continue
+            try:
+                if connections.has_connection(alias):
+                    connections.disconnect(alias)
+                connections.connect(
+                    alias=alias,
+                    host=config["host"],
+                    port=config["port"],
+                    user=config.get("username"),
+                    password=config.get("password"),
+                    secure=True if config.get("username") else False,
+                    timeout=self.connect_timeout
+                )
+                with self._changed:
+                    pool.healthy[alias] = True
+                    self._changed.notify_all()
+            except Exception as e:
+                with self._lock:
+                    pool.last_error = str(e)
+                logger.warning(f"连接数据库 {pool.database_id} ({alias}) 失败: {e}")
+
+        with self._changed:
+            if pool.needs_reconnect():
+                pool.failures += 1
+                backoff = min(self.backoff_max, self.backoff_min * (2 ** (pool.failures - 1)))
+                pool.next_retry_at = time.time() + backoff
+            else:
+                pool.failures = 0
+                pool.next_retry_at = 0.0
+                pool.last_error = None
+            pool.last_probe_at = time.time()
+            self._changed.notify_all()
+
+    def _probe_pool(self, pool: DatabasePool) -> None:
+        """对池中的连接做存活探测"""
+        for alias in pool.healthy_aliases():
+            try:
+                utility.get_server_version(using=alias, timeout=self.connect_timeout)
+            except Exception as e:
+                logger.warning(f"数据库 {pool.database_id} ({alias}) 存活探测失败: {e}")
+                self.mark_unhealthy(pool.database_id, alias, str(e))
+        pool.last_probe_at = time.time()
+
+    def _disconnect_pool(self, pool: DatabasePool) -> None:
+        for alias in pool.aliases:
+            with self._lock:
+                pool.healthy[alias] = False
+            try:
+                if connections.has_connection(alias):
+                    connections.disconnect(alias)
+            except Exception as e:
+                logger.warning(f"断开连接 {alias} 时出错: {e}")
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """判断异常是否由连接不可用引起"""
+    message = str(error).lower()
+    return any(keyword in message for keyword in ("unavailable", "connect", "deadline exceeded", "channel"))
+
+
+connection_manager = ConnectionManager(
+    pool_size=settings.MILVUS_POOL_SIZE,
+    health_check_interval=settings.MILVUS_HEALTH_CHECK_INTERVAL,
+    backoff_min=settings.MILVUS_RECONNECT_BACKOFF_MIN,
+    backoff_max=settings.MILVUS_RECONNECT_BACKOFF_MAX,
+    connect_timeout=settings.MILVUS_CONNECT_TIMEOUT,
+    acquire_timeout=settings.MILVUS_ACQUIRE_TIMEOUT
+)
+
+registry.gauge(
+    "fedui_pool_connections",
+    "Pooled Milvus connections per database by state",
+    ("database", "state"),
+    lambda: [
+        ((database_id, state), pool[state])
+        for database_id, pool in connection_manager.stats()["databases"].items()
+        for state in ("size", "healthy", "in_use")
+    ]
+)
+registry.gauge(
+    "fedui_pool_waits",
+    "Connection acquisitions that found no healthy connection and had to wait for a (re)connect",
+    ("database",),
+    lambda: [((database_id,), pool["wait_total"]) for database_id, pool in connection_manager.stats()["databases"].items()]
+)
@@ -1,9 +1,10 @@
-import json
-import os
-import uuid
+import logging
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-from pymilvus import connections, Collection, utility
+from pymilvus import utility
 from schemas.database import (
     DatabaseConnection, 
     DatabaseConnectionCreate,
@@ -12,155 +13,129 @@ from schemas.database import (
     DatabaseStatistics
 )
 from core.config import settings
+from core.metadata_store import metadata_store
 from schemas.user import User
+from services.connection_pool import connection_manager
+from services.collection_cache import collection_cache
+from services.collection_registry import collection_registry
+from services.local_engine import local_engine, is_local
+from services.result_cache import result_cache
+
+logger = logging.getLogger(__name__)
+
+# 并发收集各集合统计信息的线程池
+_statistics_executor = ThreadPoolExecutor(
+    max_workers=settings.STATS_MAX_WORKERS,
+    thread_name_prefix="collection-stats"
+)
+# 统计信息快照及最近访问时间，后台线程只刷新最近被访问过的数据库
+_statistics_snapshots: Dict[str, DatabaseStatistics] = {}
+_statistics_requested_at: Dict[str, float] = {}
+_statistics_lock = threading.Lock()
+_statistics_refresher: Optional[threading.Thread] = None
+_statistics_refresher_stopped = threading.Event()
 
 def get_db_connections() -> List[Dict]:
     """获取所有数据库连接"""
-    try:
-        if os.path.exists(settings.DATABASE_PATH):
-            with open(settings.DATABASE_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data.get("database_connections", [])
-        return []
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+    return metadata_store.list_connections()
 
 def save_db_connections(connections_data: List[Dict]) -> None:
     """保存数据库连接信息"""
-    try:
-        if os.path.exists(settings.DATABASE_PATH):
-            with open(settings.DATABASE_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        else:
-            data = {"users": []}
-            
-        data["database_connections"] = connections_data
-        
-        with open(settings.DATABASE_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        print(f"保存数据库连接信息时出错: {e}")
+    metadata_store.replace_connections(connections_data)
 
 def get_connection_by_id(connection_id: str) -> Optional[Dict]:
     """通过ID获取数据库连接"""
-    connections = get_db_connections()
-    for conn in connections:
-        if conn["id"] == connection_id:
-            return conn
-    return None
+    return metadata_store.get_connection(connection_id)
 
 def create_db_connection(connection_in: DatabaseConnectionCreate, current_user: User) -> DatabaseConnection:
     """创建新的数据库连接"""
-    connections = get_db_connections()
-    
     # 检查名称是否已存在
-    if any(conn["name"] == connection_in.name for conn in connections):
+    if metadata_store.get_connection_by_name(connection_in.name):
         raise ValueError("连接名称已存在")
     
     connection_id = str(uuid.uuid4())
     new_connection = {
         "id": connection_id,
         "name": connection_in.name,
+        "engine": connection_in.engine,
         "host": connection_in.host,
         "port": connection_in.port,
+        "path": connection_in.path,
         "username": connection_in.username,
         "password": connection_in.password,
         "description": connection_in.description,
+        "max_loaded_collections": connection_in.max_loaded_collections,
+        "loaded_memory_budget_mb": connection_in.loaded_memory_budget_mb,
         "status": "未连接",
         "created_by": current_user.id
     }
     
-    connections.append(new_connection)
-    save_db_connections(connections)
+    metadata_store.add_connection(new_connection)
     
     return DatabaseConnection(**new_connection)
 
 def update_db_connection(connection_id: str, connection_in: DatabaseConnectionUpdate) -> Optional[DatabaseConnection]:
     """更新数据库连接信息"""
-    connections = get_db_connections()
-    connection = None
-    
-    for i, conn in enumerate(connections):
-        if conn["id"] == connection_id:
-            connection = conn
-            
-            # 更新字段
-            if connection_in.name is not None:
-                connection["name"] = connection_in.name
-            if connection_in.host is not None:
-                connection["host"] = connection_in.host
-            if connection_in.port is not None:
-                connection["port"] = connection_in.port
-            if connection_in.username is not None:
-                connection["username"] = connection_in.username
-            if connection_in.password is not None:
-                connection["password"] = connection_in.password
-            if connection_in.description is not None:
-                connection["description"] = connection_in.description
-                
-            connections[i] = connection
-            break
-            
-    if connection:
-        save_db_connections(connections)
-        return DatabaseConnection(**connection)
+    # 只更新提供了的字段
+    changes = {field: value for field, value in connection_in.dict().items() if value is not None}
+    connection = metadata_store.update_connection(connection_id, changes)
+    if not connection:
+        return None
     
-    return None
+    if is_local(connection):
+        # 数据目录变化后重新打开其中的集合
+        if "path" in changes:
+            local_engine.close(connection_id)
+            result_cache.invalidate(connection_id)
+    # 连接参数变化后由连接管理器按新配置重连，原服务端的集合结构、加载记录和缓存结果不再适用
+    elif any(field in changes for field in ("host", "port", "username", "password")):
+        connection_manager.reconfigure(connection)
+        collection_registry.forget(connection_id)
+        collection_cache.invalidate(connection_id)
+        result_cache.invalidate(connection_id)
+    return DatabaseConnection(**connection)
 
 def delete_db_connection(connection_id: str) -> bool:
     """删除数据库连接"""
-    connections = get_db_connections()
-    initial_count = len(connections)
-    
-    connections = [conn for conn in connections if conn["id"] != connection_id]
-    
-    if len(connections) < initial_count:
-        save_db_connections(connections)
-        return True
+    if not metadata_store.delete_connection(connection_id):
+        return False
     
-    return False
+    connection_manager.close(connection_id)
+    local_engine.close(connection_id)
+    collection_registry.forget(connection_id)
+    collection_cache.invalidate(connection_id)
+    result_cache.invalidate(connection_id)
+    with _statistics_lock:
+        _statistics_snapshots.pop(connection_id, None)
+        _statistics_requested_at.pop(connection_id, None)
+    return True
 
 def connect_to_db(connection_id: str) -> DatabaseStatus:
-    """连接到指定的数据库"""
+    """连接到指定的数据库，建立该数据库的连接池"""
     connection = get_connection_by_id(connection_id)
     if not connection:
         raise ValueError("数据库连接不存在")
+    if is_local(connection):
+        return _open_local_db(connection)
     
-    print(connection)
     # 尝试连接到Milvus
     try:
-        alias = f"conn_{connection_id}"
-        connections.connect(
-            alias=alias,
-            host=connection["host"],
-            port=connection["port"],
-            user=connection.get("username"),
-            password=connection.get("password"),
-            secure=True if connection.get("username") else False
-        )
-        
-        # 检查连接是否成功
-        if connections.has_connection(alias):
-        # if utility.list_collections():
-            # 更新连接状态
-            connection["status"] = "已连接"
+        if connection_manager.open(connection):
             update_connection_status(connection_id, "已连接")
-            print("连接成功")
             return DatabaseStatus(
                 id=connection_id,
                 status="已连接",
-                details={"message": "连接成功"}
+                details={"message": "连接成功", "pool": connection_manager.stats()["databases"].get(connection_id)}
             )
         else:
-            print("无法建立连接")
             update_connection_status(connection_id, "连接失败")
             return DatabaseStatus(
                 id=connection_id,
                 status="连接失败",
-                details={"message": "无法建立连接"}
+                details={"message": connection_manager.stats()["databases"].get(connection_id, {}).get("last_error") or "无法建立连接"}
             )
     except Exception as e:
-        print(f"连接数据库时出错: {e}")
+        logger.warning(f"连接数据库时出错: {e}")
         update_connection_status(connection_id, "连接失败")
         return DatabaseStatus(
             id=connection_id,
@@ -168,19 +143,32 @@ def connect_to_db(connection_id: str) -> DatabaseStatus:
             details={"message": str(e)}
         )
 
+def _open_local_db(connection: Dict) -> DatabaseStatus:
+    """本地引擎无需建立连接，只校验数据目录"""
+    connection_id = connection["id"]
+    try:
+        collection_names = local_engine.open(connection)
+    except Exception as e:
+        logger.warning(f"打开本地数据目录时出错: {e}")
+        update_connection_status(connection_id, "连接失败")
+        return DatabaseStatus(id=connection_id, status="连接失败", details={"message": str(e)})
+    update_connection_status(connection_id, "已连接")
+    return DatabaseStatus(
+        id=connection_id,
+        status="已连接",
+        details={"message": "连接成功", "collections": collection_names}
+    )
+
 def disconnect_from_db(connection_id: str) -> DatabaseStatus:
-    """断开与指定数据库的连接"""
+    """断开与指定数据库的连接，关闭该数据库的连接池"""
     connection = get_connection_by_id(connection_id)
     if not connection:
         raise ValueError("数据库连接不存在")
-    print(connection)
-    alias = f"conn_{connection_id}"
-    print(alias)
     try:
-        if connections.has_connection(alias):
-            print("断开连接")
-            connections.disconnect(alias)
-            
+        connection_manager.close(connection_id)
+        local_engine.close(connection_id)
+        collection_registry.forget(connection_id)
+        collection_cache.invalidate(connection_id)
         update_connection_status(connection_id, "未连接")
         return DatabaseStatus(
             id=connection_id,
@@ -188,7 +176,7 @@ def disconnect_from_db(connection_id: str) -> DatabaseStatus:
             details={"message": "已断开连接"}
         )
     except Exception as e:
-        print(f"断开连接时出错: {e}")
+        logger.warning(f"断开连接时出错: {e}")
         return DatabaseStatus(
             id=connection_id,
             status=connection["status"],
@@ -197,82 +185,136 @@ def disconnect_from_db(connection_id: str) -> DatabaseStatus:
 
 def update_connection_status(connection_id: str, status: str) -> None:
     """更新连接状态"""
-    connections_data = get_db_connections()
-    
-    for i, conn in enumerate(connections_data):
-        if conn["id"] == connection_id:
-            conn["status"] = status
-            connections_data[i] = conn
-            break
-            
-    save_db_connections(connections_data)
+    metadata_store.update_connection(connection_id, {"status": status})
 
-def get_db_statistics(connection_id: str) -> DatabaseStatistics:
-    """获取数据库统计信息"""
+def get_db_statistics(connection_id: str, fresh: bool = False) -> DatabaseStatistics:
+    """获取数据库统计信息，默认返回后台定期刷新的快照，fresh为True时重新收集"""
     connection = get_connection_by_id(connection_id)
     if not connection:
         raise ValueError("数据库连接不存在")
-    # print(connection)
-    alias = f"conn_{connection_id}"
-    print(alias)
+
+    now = time.time()
+    with _statistics_lock:
+        _statistics_requested_at[connection_id] = now
+        snapshot = _statistics_snapshots.get(connection_id)
+    if snapshot and not fresh and now - snapshot.collected_at < settings.STATS_SNAPSHOT_TTL:
+        return snapshot
+
     try:
-        print(1)
-        print(connections.has_connection(alias))
-        # if connections.has_connection(alias):
-        #     print("已连接")
-        # else:
-        #     print("未连接")
-        #     connections.connect(
-        #         alias=alias,
-        #         host=connection["host"],
-        #         port=connection["port"],
-        #         user=connection.get("username"),
-        #         password=connection.get("password"),
-        #         secure=True if connection.get("username") else False
-        #     )
-        if not connections.has_connection(alias):
-            # 尝试连接
-            print("try connect")
-            connect_to_db(connection_id)
-        print(connections.has_connection(alias))
-        # 获取所有集合
-        collection_names = utility.list_collections(using=alias)
-        # collection_names = connections.list_collections(alias)
-        print(collection_names)
-        collections = []
-        total_entities = 0
-        
-        for name in collection_names:
-            try:
-                col = Collection(name,using= alias)
-                entity_count = col.num_entities
-                total_entities += entity_count
-                if col.has_index():
-                    index_info = col.index()
-                    print(index_info._index_params["index_type"])
-                print(col.indexes)
+        return _refresh_db_statistics(connection)
+    except Exception as e:
+        logger.warning(f"获取数据库统计信息时出错: {e}")
+        raise ValueError(f"获取数据库统计信息时出错: {str(e)}")
 
+def _refresh_db_statistics(connection: Dict) -> DatabaseStatistics:
+    """收集统计信息并更新快照"""
+    if is_local(connection):
+        stats = _collect_local_statistics(connection)
+    else:
+        with connection_manager.acquire(connection) as alias:
+            stats = _collect_db_statistics(connection["id"], alias)
+    with _statistics_lock:
+        _statistics_snapshots[connection["id"]] = stats
+    return stats
 
-                collections.append({
-                    "name": name,
-                    "entity_count": entity_count,
-                    "index_status": str(col.index()._index_params["index_type"]) if col.has_index() else "未创建",
-                    "description": ""
-                })
-            except Exception as e:
-                print(f"获取集合 {name} 信息时出错: {e}")
-                collections.append({
-                    "name": name,
-                    "entity_count": 0,
-                    "index_status": "未知",
-                    "description": f"错误: {str(e)}"
-                })
-        
-        return DatabaseStatistics(
-            collection_count=len(collection_names),
-            total_entities=total_entities,
-            collections=collections
-        )
+def _collect_db_statistics(connection_id: str, alias: str) -> DatabaseStatistics:
+    """通过指定连接并发收集所有集合的统计信息"""
+    # 获取所有集合，已不存在的集合从结构缓存中移除
+    collection_names = utility.list_collections(using=alias)
+    collection_cache.retain(connection_id, collection_names)
+
+    collections = list(_statistics_executor.map(
+        lambda name: _collect_collection_statistics(connection_id, alias, name),
+        collection_names
+    ))
+    
+    return DatabaseStatistics(
+        collection_count=len(collection_names),
+        total_entities=sum(collection["entity_count"] for collection in collections),
+        collections=collections,
+        collected_at=time.time()
+    )
+
+def _collect_collection_statistics(connection_id: str, alias: str, name: str) -> Dict[str, Any]:
+    """收集单个集合的统计信息，每项数据只请求一次"""
+    try:
+        info, col = collection_cache.get(connection_id, alias, name)
+        entity_count = col.num_entities
+        # 索引类型已在构建结构缓存时读取，不再重复请求
+        index_types = [field["index_type"] for field in info.vector_fields.values() if field["index_type"]]
+        return {
+            "name": name,
+            "entity_count": entity_count,
+            "index_status": ", ".join(index_types) if index_types else "未创建",
+            "description": ""
+        }
     except Exception as e:
-        print(f"获取数据库统计信息时出错: {e}")
-        raise ValueError(f"获取数据库统计信息时出错: {str(e)}")
\ No newline at end of file
+        logger.warning(f"获取集合 {name} 信息时出错: {e}")
+        return {
+            "name": name,
+            "entity_count": 0,
+            "index_status": "未知",
+            "description": f"错误: {str(e)}"
+        }
+
+def _collect_local_statistics(connection: Dict) -> DatabaseStatistics:
+    """本地集合的统计信息直接读取向量文件头，无需扫描数据"""
+    collections = []
+    for name in local_engine.list_collections(connection):
+        try:
+            collection = local_engine.get(connection, name)
+            collections.append({
+                "name": name,
+                "entity_count": collection.num_entities,
+                "index_status": f"FLAT ({collection.metric_type})",
+                "description": collection.description
+            })
+        except Exception as e:
+            logger.warning(f"获取本地集合 {name} 信息时出错: {e}")
+            collections.append({
+                "name": name,
+                "entity_count": 0,
+                "index_status": "未知",
+                "description": f"错误: {str(e)}"
+            })
+    return DatabaseStatistics(
+        collection_count=len(collections),
+        total_entities=sum(collection["entity_count"] for collection in collections),
+        collections=collections,
+        collected_at=time.time()
+    )
+
+def _refresh_statistics_loop() -> None:
+    """后台定期刷新最近被访问过的数据库的统计快照"""
+    while not _statistics_refresher_stopped.wait(settings.STATS_REFRESH_INTERVAL):
+        now = time.time()
+        with _statistics_lock:
+            database_ids = [
+                database_id for database_id, requested_at in _statistics_requested_at.items()
+                if now - requested_at < settings.STATS_REFRESH_IDLE_TIMEOUT
+            ]
+        for database_id in database_ids:
+            connection = get_connection_by_id(database_id)
+            if not connection:
+                with _statistics_lock:
+                    _statistics_requested_at.pop(database_id, None)
+                    _statistics_snapshots.pop(database_id, None)
+                continue
+            try:
+                _refresh_db_statistics(connection)
+            except Exception as e:
+                logger.warning(f"后台刷新数据库 {database_id} 的统计信息时出错: {e}")
+
+def start_statistics_refresher() -> None:
+    """启动统计快照的后台刷新线程"""
+    global _statistics_refresher
+    if _statistics_refresher and _statistics_refresher.is_alive():
+        return
+    _statistics_refresher_stopped.clear()
+    _statistics_refresher = threading.Thread(
+        target=_refresh_statistics_loop, name="statistics-refresher", daemon=True
+    )
+    _statistics_refresher.start()
+
+def stop_statistics_refresher() -> None:
+    _statistics_refresher_stopped.set()
@@ -0,0 +1,286 @@
+import json
+import logging
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from pymilvus import DataType
+from core.config import settings
+from core.metadata_store import metadata_store
+from services.collection_cache import collection_cache
+from services.collection_registry import collection_registry
+from services.connection_pool import connection_manager
+from services.database import get_connection_by_id
+from services.local_engine import local_engine, is_local, exact_top_k
+from services.query import execute_vector_query, normalize_vector_data
+from schemas.query import SearchParamsEvaluationResult
+
+logger = logging.getLogger(__name__)
+
+# 未提供候选参数时按索引类型生成的取值
+IVF_NPROBE_CANDIDATES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+GRAPH_EF_CANDIDATES = (16, 32, 64, 128, 256, 512)
+
+
+def fetch_stored_vectors(
+    connection: Dict[str, Any],
+    collection_name: str,
+    anns_field: Optional[str] = None
+) -> Tuple[np.ndarray, np.ndarray, str, Optional[str]]:
+    """读取集合中已存储的全部向量，返回(主键, 向量, 默认度量类型, 索引类型)"""
+    if is_local(connection):
+        collection = local_engine.get(connection, collection_name)
+        collection.vector_field(anns_field)
+        ids = np.asarray(collection.ids) if collection.ids is not None else np.arange(collection.num_entities)
+        # 本地集合直接使用内存映射的向量，真值计算时按块读取
+        return ids, collection.vectors, collection.metric_type, "FLAT"
+
+    try:
+        return _fetch_milvus_vectors(connection, collection_name, anns_field)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"读取集合 {collection_name} 的已存储向量失败: {str(e)}")
+
+
+def _primary_key_expr(primary_field: str, dtype: Any, last: Any) -> str:
+    """主键大于last的过滤表达式，last为None时匹配全部实体"""
+    if dtype == DataType.VARCHAR:
+        return f"{primary_field} > {json.dumps(last)}" if last is not None else f'{primary_field} >= ""'
+    return f"{primary_field} > {int(last)}" if last is not None else f"{primary_field} >= {-2 ** 63}"
+
+
+def _fetch_milvus_vectors(
+    connection: Dict[str, Any],
+    collection_name: str,
+    anns_field: Optional[str]
+) -> Tuple[np.ndarray, np.ndarray, str, Optional[str]]:
+    database_id = connection["id"]
+    with connection_manager.acquire(connection) as alias:
+        info, collection = collection_cache.get(database_id, alias, collection_name)
+        field_name, field_info = info.vector_field(anns_field)
+        if field_info["binary"]:
+            raise ValueError(f"字段 {field_name} 是二进制向量，不支持计算精确真值")
+        num_entities = collection.num_entities
+        dim = field_info["dim"]
+        # 全部向量以float32读入API进程内存，按字节数而不是条数限制
+        base_mb = num_entities * dim * 4 / (1024 * 1024)
+        if base_mb > settings.EVAL_MAX_BASE_MB:
+            raise ValueError(
+                f"集合 {collection_name} 的 {num_entities} 个 {dim} 维向量约需 {base_mb:.1f}MB 内存，"
+                f"超过计算精确真值的上限 {settings.EVAL_MAX_BASE_MB}MB"
+            )
+        primary_field = info.primary_field
+        varchar_key = info.primary_field_dtype == DataType.VARCHAR
+
+        # 按实体数预先分配，每页直接写入，避免在Python列表中积累全部向量
+        ids = np.empty(num_entities, dtype=object if varchar_key else np.int64)
+        vectors = np.empty((num_entities, dim), dtype=np.float32)
+        count = 0
+        last = None
+        with collection_registry.pin(connection, alias, collection):
+            # 按主键分页(主键 > 上一页最大主键)，不使用offset：offset+limit受服务端上限约束，且没有排序时分页不稳定
+            while count < num_entities:
+                limit = min(settings.EVAL_FETCH_PAGE_SIZE, num_entities - count)
+                rows = collection.query(
+                    expr=_primary_key_expr(primary_field, info.primary_field_dtype, last),
+                    output_fields=[primary_field, field_name],
+                    limit=limit
+                )
+                if not rows:
+                    break
+                rows.sort(key=lambda row: row[primary_field])
+                ids[count:count + len(rows)] = [row[primary_field] for row in rows]
+                vectors[count:count + len(rows)] = [row[field_name] for row in rows]
+                count += len(rows)
+                last = rows[-1][primary_field]
+                if len(rows) < limit:
+                    break
+            # num_entities只统计已落盘的实体，读满后再确认没有更多实体，避免在不完整的数据上计算真值
+            if count == num_entities and count > 0:
+                extra = collection.query(
+                    expr=_primary_key_expr(primary_field, info.primary_field_dtype, last),
+                    output_fields=[primary_field],
+                    limit=1
+                )
+                if extra:
+                    count += len(extra)
+    if count != num_entities:
+        raise ValueError(
+            f"集合 {collection_name} 读取到的向量数与实体数 {num_entities} 不一致，"
+            "可能有正在写入或未落盘的数据，请在数据稳定(flush)后重试"
+        )
+    if count == 0:
+        raise ValueError(f"集合 {collection_name} 中没有已存储的向量")
+    return ids, vectors, field_info["metric_type"] or "L2", field_info["index_type"]
+
+
+def default_candidates(index_type: Optional[str], top_k: int) -> List[Dict[str, Any]]:
+    """按索引类型生成候选查询参数"""
+    index_type = (index_type or "").upper()
+    if index_type.startswith("IVF") or index_type in ("SCANN", "GPU_IVF_FLAT", "GPU_IVF_PQ"):
+        return [{"params": {"nprobe": nprobe}} for nprobe in IVF_NPROBE_CANDIDATES]
+    if index_type == "HNSW":
+        return [{"params": {"ef": ef}} for ef in sorted({max(ef, top_k) for ef in GRAPH_EF_CANDIDATES})]
+    if index_type == "DISKANN":
+        return [{"params": {"search_list": value}} for value in sorted({max(value, top_k) for value in GRAPH_EF_CANDIDATES})]
+    # FLAT等没有可调查询参数的索引
+    return [{}]
+
+
+def recall_at_k(result_ids: List[List[Any]], truth_ids: np.ndarray) -> float:
+    """各查询向量返回结果与真值top_k的交集比例的平均值"""
+    recalls = []
+    for returned, truth in zip(result_ids, truth_ids.tolist()):
+        if truth:
+            recalls.append(len(set(returned) & set(truth)) / len(truth))
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+def pareto_front(rows: List[Dict[str, Any]]) -> None:
+    """标记召回率-p99延迟的帕累托最优参数：不存在召回率不低且延迟不高、并至少一项更优的其他参数"""
+    valid = [row for row in rows if row.get("error") is None]
+    for row in rows:
+        row["pareto"] = row.get("error") is None and not any(
+            other is not row
+            and other["recall"] >= row["recall"]
+            and other["p99_ms"] <= row["p99_ms"]
+            and (other["recall"] > row["recall"] or other["p99_ms"] < row["p99_ms"])
+            for other in valid
+        )
+
+
+def recommend(rows: List[Dict[str, Any]], target_recall: float) -> Optional[Dict[str, Any]]:
+    """满足目标召回率且p99延迟最低的参数，没有参数达到目标时选择召回率最高的"""
+    front = [row for row in rows if row["pareto"]]
+    if not front:
+        return None
+    qualified = [row for row in front if row["recall"] >= target_recall]
+    if qualified:
+        return min(qualified, key=lambda row: (row["p99_ms"], -row["recall"]))
+    return max(front, key=lambda row: (row["recall"], -row["p99_ms"]))
+
+
+def evaluate_search_params(
+    database_id: str,
+    collection_name: str,
+    anns_field: Optional[str] = None,
+    top_k: int = 10,
+    vector_data: Optional[np.ndarray] = None,
+    sample_size: int = 100,
+    candidates: Optional[List[Dict[str, Any]]] = None,
+    repeats: int = 1,
+    target_recall: float = 0.95,
+    save: bool = True,
+    seed: Optional[int] = None,
+    user: Optional[str] = None
+) -> SearchParamsEvaluationResult:
+    """对候选查询参数逐一执行查询，比较召回率与延迟，并给出推荐参数
+
+    真值由NumPy在集合已存储的全部向量上精确计算；每个查询向量单独执行execute_vector_query(不使用结果缓存)计时，
+    与线上单向量查询的延迟一致。save为True时推荐参数保存到数据库连接的recommended_search_params中。
+    """
+    connection = get_connection_by_id(database_id)
+    if not connection:
+        raise ValueError("数据库连接不存在")
+
+    start_time = time.time()
+    ids, base, default_metric, index_type = fetch_stored_vectors(connection, collection_name, anns_field)
+    if vector_data is not None:
+        queries = normalize_vector_data(vector_data)
+    else:
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(len(base), size=min(sample_size, len(base)), replace=False))
+        queries = np.asarray(base[rows], dtype=np.float32)
+    if queries.shape[1] != base.shape[1]:
+        raise ValueError(f"查询向量维度为 {queries.shape[1]}，但集合 {collection_name} 的向量维度为 {base.shape[1]}")
+
+    # 不同度量类型的真值分别计算
+    truths: Dict[str, np.ndarray] = {}
+
+    def ground_truth(metric_type: str) -> np.ndarray:
+        if metric_type not in truths:
+            truth_rows, _ = exact_top_k(
+                base, queries, top_k, metric_type, settings.LOCAL_ENGINE_BUFFER_MB * 1024 * 1024
+            )
+            truths[metric_type] = ids[truth_rows]
+        return truths[metric_type]
+
+    ground_truth(default_metric.upper())
+    ground_truth_time = time.time() - start_time
+
+    table = []
+    for search_params in candidates or default_candidates(index_type, top_k):
+        row: Dict[str, Any] = {"search_params": search_params, "error": None}
+        try:
+            metric_type = str(search_params.get("metric_type") or default_metric).upper()
+            truth = ground_truth(metric_type)
+            # 预热一次，避免首次查询的集合加载计入延迟
+            execute_vector_query(
+                database_id, collection_name, queries[:1], top_k, search_params, None, anns_field,
+                use_cache=False, user=user
+            )
+            latencies = []
+            result_ids: List[List[Any]] = []
+            for repeat in range(repeats):
+                for query in queries:
+                    query_start = time.perf_counter()
+                    result = execute_vector_query(
+                        database_id, collection_name, query[None, :], top_k, search_params, None, anns_field,
+                        use_cache=False, user=user
+                    )
+                    latencies.append(time.perf_counter() - query_start)
+                    if repeat == 0:
+                        result_ids.append([hit["id"] for hit in result.results])
+            values = np.asarray(latencies) * 1000.0
+            row.update({
+                "recall": recall_at_k(result_ids, truth),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p99_ms": float(np.percentile(values, 99)),
+                "mean_ms": float(values.mean())
+            })
+        except Exception as e:
+            logger.warning(f"评估数据库 {database_id} 集合 {collection_name} 的查询参数 {search_params} 时出错: {e}")
+            row.update({"recall": None, "p50_ms": None, "p99_ms": None, "mean_ms": None, "error": str(e)})
+        table.append(row)
+
+    pareto_front(table)
+    table.sort(key=lambda row: (row["error"] is not None, row["p99_ms"] or 0.0))
+    best = recommend(table, target_recall)
+    recommended = None
+    if best is not None:
+        recommended = {
+            "search_params": best["search_params"],
+            "recall": best["recall"],
+            "p50_ms": best["p50_ms"],
+            "p99_ms": best["p99_ms"],
+            "top_k": top_k,
+            "target_recall": target_recall,
+            "sample_size": len(queries),
+            "evaluated_at": time.time()
+        }
+        if save:
+            save_recommended_search_params(database_id, collection_name, recommended)
+
+    return SearchParamsEvaluationResult(
+        database_id=database_id,
+        collection_name=collection_name,
+        top_k=top_k,
+        sample_size=len(queries),
+        base_size=len(base),
+        ground_truth_time=ground_truth_time,
+        table=table,
+        recommended=recommended
+    )
+
+
+def save_recommended_search_params(database_id: str, collection_name: str, recommended: Dict[str, Any]) -> None:
+    """推荐参数按集合名称保存在数据库连接中"""
+
+    def modify(connection: Dict[str, Any]) -> Dict[str, Any]:
+        saved = connection.get("recommended_search_params") or {}
+        saved[collection_name] = recommended
+        return {"recommended_search_params": saved}
+
+    # 在元数据存储的锁内读-改-写，与其他集合的并发评估互不覆盖
+    if metadata_store.modify_connection(database_id, modify) is None:
+        raise ValueError("数据库连接不存在")
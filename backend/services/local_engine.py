@@ -0,0 +1,315 @@
+import json
+import os
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from core.config import settings
+from core.metrics import registry
+
+# 本地引擎的连接类型，全部取值见schemas.database.ENGINE_TYPES
+LOCAL_ENGINE = "local"
+
+# 本地引擎支持的度量类型，L2与Milvus一致返回平方距离
+LOCAL_METRIC_TYPES = ("L2", "IP", "COSINE")
+# 本地集合只有一个向量字段
+LOCAL_VECTOR_FIELD = "vector"
+
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "ids.npy"
+METADATA_FILE = "metadata.json"
+
+
+def is_local(connection: Dict[str, Any]) -> bool:
+    return connection.get("engine") == LOCAL_ENGINE
+
+
+class LocalCollection:
+    """目录中的一个本地集合
+
+    目录结构: <集合名>/vectors.npy(必需，n × dim)、ids.npy(可选，n个整数主键，默认为行号)、
+    metadata.json(可选，{"metric_type": ..., "description": ..., "fields": {字段名: [n个值]}})。
+    向量以内存映射方式打开，查询时按块读取，不会整体载入内存。
+    """
+
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.directory = directory
+        vectors_path = os.path.join(directory, VECTORS_FILE)
+        self.mtime = os.path.getmtime(vectors_path)
+        self.vectors = np.load(vectors_path, mmap_mode="r")
+        if self.vectors.ndim != 2:
+            raise ValueError(f"本地集合 {name} 的向量文件必须是二维数组，实际形状为 {self.vectors.shape}")
+        if self.vectors.dtype.kind not in "fiu":
+            raise ValueError(f"本地集合 {name} 的向量类型 {self.vectors.dtype} 不是数值类型")
+        self.num_entities, self.dim = self.vectors.shape
+
+        ids_path = os.path.join(directory, IDS_FILE)
+        self.ids: Optional[np.ndarray] = None
+        if os.path.exists(ids_path):
+            self.ids = np.load(ids_path, mmap_mode="r")
+            if self.ids.shape != (self.num_entities,):
+                raise ValueError(f"本地集合 {name} 的主键数量与向量数量 {self.num_entities} 不一致")
+
+        metadata: Dict[str, Any] = {}
+        metadata_path = os.path.join(directory, METADATA_FILE)
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        self.metric_type = str(metadata.get("metric_type") or "L2").upper()
+        if self.metric_type not in LOCAL_METRIC_TYPES:
+            raise ValueError(f"本地集合 {name} 的度量类型 {self.metric_type} 不受支持，支持: {', '.join(LOCAL_METRIC_TYPES)}")
+        self.description = metadata.get("description") or ""
+        self.fields: Dict[str, List[Any]] = metadata.get("fields") or {}
+        for field, values in self.fields.items():
+            if len(values) != self.num_entities:
+                raise ValueError(f"本地集合 {name} 的字段 {field} 有 {len(values)} 个值，向量数量为 {self.num_entities}")
+
+        # 各行向量的平方范数，首次用到L2或COSINE时分块计算
+        self._sq_norms: Optional[np.ndarray] = None
+        self._norms_lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+    def vector_field(self, anns_field: Optional[str] = None) -> str:
+        name = anns_field or LOCAL_VECTOR_FIELD
+        if name != LOCAL_VECTOR_FIELD:
+            raise ValueError(f"本地集合 {self.name} 中不存在向量字段 {name}，可用字段: {[LOCAL_VECTOR_FIELD]}")
+        return name
+
+    def validate_dimension(self, vectors: np.ndarray) -> None:
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"查询向量维度为 {vectors.shape[1]}，但本地集合 {self.name} 的维度为 {self.dim}")
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        metric_type: Optional[str] = None,
+        output_fields: Optional[List[str]] = None,
+        buffer_bytes: int = 64 * 1024 * 1024
+    ) -> List[List[Dict[str, Any]]]:
+        """精确的批量top-k查询，返回与Milvus查询相同格式的结果"""
+        metric = (metric_type or self.metric_type).upper()
+        for field in output_fields or []:
+            if field != "id" and field not in self.fields:
+                raise ValueError(f"本地集合 {self.name} 中不存在字段 {field}，可用字段: {list(self.fields)}")
+        self.validate_dimension(queries)
+        sq_norms = self._squared_norms() if metric in ("L2", "COSINE") else None
+        rows, distances = exact_top_k(self.vectors, queries, top_k, metric, buffer_bytes, sq_norms)
+        return [self._marshal(hit_rows, hit_distances, output_fields) for hit_rows, hit_distances in zip(rows, distances)]
+
+    def _marshal(
+        self,
+        rows: np.ndarray,
+        distances: np.ndarray,
+        output_fields: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        ids = (self.ids[rows] if self.ids is not None else rows).tolist()
+        hits = [{"id": hit_id, "distance": distance} for hit_id, distance in zip(ids, distances.tolist())]
+        for field in output_fields or []:
+            values = ids if field == "id" else [self.fields[field][row] for row in rows.tolist()]
+            for hit, value in zip(hits, values):
+                hit[field] = value
+        return hits
+
+    def _squared_norms(self) -> np.ndarray:
+        if self._sq_norms is None:
+            with self._norms_lock:
+                if self._sq_norms is None:
+                    self._sq_norms = squared_norms(self.vectors)
+        return self._sq_norms
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "num_entities": self.num_entities,
+            "dim": self.dim,
+            "dtype": str(self.vectors.dtype),
+            "metric_type": self.metric_type,
+            "fields": list(self.fields),
+            "bytes": self.nbytes
+        }
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def squared_norms(vectors: np.ndarray, buffer_bytes: int = 64 * 1024 * 1024) -> np.ndarray:
+    """分块计算各行向量的平方范数，内存映射的向量不会整体载入内存"""
+    result = np.empty(len(vectors), dtype=np.float32)
+    step = max(1, buffer_bytes // (4 * max(1, vectors.shape[1])))
+    for start in range(0, len(vectors), step):
+        block = np.asarray(vectors[start:start + step], dtype=np.float32)
+        result[start:start + step] = np.einsum("ij,ij->i", block, block)
+    return result
+
+
+def exact_top_k(
+    base: np.ndarray,
+    queries: np.ndarray,
+    top_k: int,
+    metric_type: str,
+    buffer_bytes: int = 64 * 1024 * 1024,
+    sq_norms: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """在base(n × dim，可为内存映射)上精确查询(nq × dim)个向量，返回(nq × k)的行号和距离
+
+    每块计算一次(nq × 块行数)的矩阵乘法(由BLAS完成)，块行数按buffer_bytes同时限制得分矩阵和转换为float32的向量块的大小；
+    每块用argpartition取出候选后与当前最优结果合并，最后只对top_k个结果排序。
+    L2与Milvus一致返回平方距离，IP与COSINE返回相似度(越大越好)。
+    """
+    metric = metric_type.upper()
+    if metric not in LOCAL_METRIC_TYPES:
+        raise ValueError(f"本地引擎不支持度量类型 {metric}，支持: {', '.join(LOCAL_METRIC_TYPES)}")
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    nq = len(queries)
+    num_rows = len(base)
+    k = min(top_k, num_rows)
+    if k <= 0:
+        return np.empty((nq, 0), dtype=np.int64), np.empty((nq, 0), dtype=np.float32)
+
+    # 统一为"越小越好"的排序键：L2为平方距离，IP与COSINE取相反数
+    larger_is_better = metric != "L2"
+    if metric in ("L2", "COSINE") and sq_norms is None:
+        sq_norms = squared_norms(base, buffer_bytes)
+    if metric == "COSINE":
+        queries = _normalize(queries)
+        norms = np.sqrt(sq_norms)
+        norms[norms == 0] = 1.0
+    query_sq = np.einsum("ij,ij->i", queries, queries)[:, None] if metric == "L2" else None
+
+    # 每行占用得分矩阵中的nq个float32；base不是float32时还要复制出dim个float32
+    chunk_rows = max(k, buffer_bytes // (4 * (nq + base.shape[1])))
+    best_keys = np.empty((nq, 0), dtype=np.float32)
+    best_rows = np.empty((nq, 0), dtype=np.int64)
+    for start in range(0, num_rows, chunk_rows):
+        stop = min(start + chunk_rows, num_rows)
+        block = np.asarray(base[start:stop], dtype=np.float32)
+        scores = queries @ block.T
+        if metric == "L2":
+            # |q - x|² = |q|² - 2q·x + |x|²，舍入误差可能产生微小的负数
+            scores *= -2.0
+            scores += query_sq
+            scores += sq_norms[start:stop]
+            np.maximum(scores, 0.0, out=scores)
+            keys = scores
+        elif metric == "COSINE":
+            scores /= norms[start:stop]
+            keys = np.negative(scores, out=scores)
+        else:
+            keys = np.negative(scores, out=scores)
+
+        if stop - start > k:
+            part = np.argpartition(keys, k - 1, axis=1)[:, :k]
+            chunk_keys = np.take_along_axis(keys, part, axis=1)
+            chunk_rows_index = part + start
+        else:
+            chunk_keys = keys
+            chunk_rows_index = np.broadcast_to(np.arange(start, stop), keys.shape)
+        best_keys = np.concatenate([best_keys, chunk_keys], axis=1)
+        best_rows = np.concatenate([best_rows, chunk_rows_index], axis=1)
+        if best_keys.shape[1] > k:
+            part = np.argpartition(best_keys, k - 1, axis=1)[:, :k]
+            best_keys = np.take_along_axis(best_keys, part, axis=1)
+            best_rows = np.take_along_axis(best_rows, part, axis=1)
+
+    order = np.argsort(best_keys, axis=1, kind="stable")
+    best_keys = np.take_along_axis(best_keys, order, axis=1)
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    return best_rows, (-best_keys if larger_is_better else best_keys)
+
+
+class LocalEngine:
+    """本地NumPy暴力检索引擎，以目录作为"数据库"，其中每个子目录是一个集合
+
+    打开的集合按(数据库ID, 集合名称)缓存，向量文件被替换后自动重新打开。
+    """
+
+    def __init__(self, buffer_bytes: int):
+        self.buffer_bytes = buffer_bytes
+        self._collections: Dict[Tuple[str, str], LocalCollection] = {}
+        self._lock = threading.Lock()
+        self.searches = 0
+
+    def open(self, connection: Dict[str, Any]) -> List[str]:
+        """校验数据目录并返回其中的集合"""
+        return self.list_collections(connection)
+
+    def close(self, database_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._collections if key[0] == database_id]:
+                del self._collections[key]
+
+    def list_collections(self, connection: Dict[str, Any]) -> List[str]:
+        root = _root(connection)
+        return sorted(
+            name for name in os.listdir(root)
+            if os.path.isfile(os.path.join(root, name, VECTORS_FILE))
+        )
+
+    def get(self, connection: Dict[str, Any], collection_name: str) -> LocalCollection:
+        """打开(或返回已打开的)本地集合"""
+        root = _root(connection)
+        directory = os.path.join(root, collection_name)
+        vectors_path = os.path.join(directory, VECTORS_FILE)
+        if os.path.dirname(os.path.normpath(directory)) != os.path.normpath(root) or not os.path.isfile(vectors_path):
+            raise ValueError(f"本地集合 {collection_name} 不存在")
+        key = (connection["id"], collection_name)
+        with self._lock:
+            collection = self._collections.get(key)
+        if collection is not None and collection.mtime == os.path.getmtime(vectors_path):
+            return collection
+        collection = LocalCollection(collection_name, directory)
+        with self._lock:
+            self._collections[key] = collection
+        return collection
+
+    def search(
+        self,
+        connection: Dict[str, Any],
+        collection_name: str,
+        queries: np.ndarray,
+        top_k: int,
+        metric_type: Optional[str] = None,
+        output_fields: Optional[List[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        collection = self.get(connection, collection_name)
+        with self._lock:
+            self.searches += 1
+        return collection.search(queries, top_k, metric_type, output_fields, self.buffer_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buffer_bytes": self.buffer_bytes,
+                "searches": self.searches,
+                "collections": [
+                    {"database_id": database_id, **collection.describe()}
+                    for (database_id, _), collection in self._collections.items()
+                ]
+            }
+
+
+def _root(connection: Dict[str, Any]) -> str:
+    root = connection.get("path")
+    if not root or not os.path.isdir(root):
+        raise ValueError(f"本地数据目录不存在: {root}")
+    return root
+
+
+local_engine = LocalEngine(buffer_bytes=settings.LOCAL_ENGINE_BUFFER_MB * 1024 * 1024)
+
+registry.gauge(
+    "fedui_local_collection_bytes",
+    "Memory-mapped vector bytes of opened local collections",
+    ("database", "collection"),
+    lambda: [
+        ((collection["database_id"], collection["name"]), collection["bytes"])
+        for collection in local_engine.stats()["collections"]
+    ]
+)
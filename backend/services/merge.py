@@ -0,0 +1,48 @@
+import heapq
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+# 距离越大表示越相似的度量类型，其余度量(L2、HAMMING等)越小越相似
+LARGER_IS_BETTER_METRICS = {"IP", "COSINE"}
+
+def is_larger_better(metric_type: Optional[str]) -> bool:
+    """判断度量类型是否为距离越大越相似"""
+    return (metric_type or "L2").upper() in LARGER_IS_BETTER_METRICS
+
+def merge_top_k(
+    sources: Sequence[Tuple[str, str, List[Dict[str, Any]]]],
+    top_k: int,
+    metric_type: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """对多个已排序的结果列表做k路堆归并，只生成最终的top_k条结果
+
+    sources中每一项为(数据库ID, 集合名称, 按相似度排好序的结果列表)，
+    堆中最多同时保存len(sources)个元素，复杂度为O(k·log D)。
+    """
+    if top_k <= 0:
+        return []
+
+    # 统一转换为越小越好的排序键
+    sign = -1.0 if is_larger_better(metric_type) else 1.0
+
+    heap = [
+        (sign * hits[0]["distance"], source_index, 0)
+        for source_index, (_, _, hits) in enumerate(sources)
+        if hits
+    ]
+    heapq.heapify(heap)
+
+    merged = []
+    while heap and len(merged) < top_k:
+        _, source_index, position = heapq.heappop(heap)
+        database_id, collection_name, hits = sources[source_index]
+        merged.append({
+            "database_id": database_id,
+            "collection_name": collection_name,
+            **hits[position]
+        })
+
+        position += 1
+        if position < len(hits):
+            heapq.heappush(heap, (sign * hits[position]["distance"], source_index, position))
+
+    return merged
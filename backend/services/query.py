@@ -1,170 +1,765 @@
+import json
+import logging
 import time
 import numpy as np
-from typing import List, Dict, Any, Optional, Union
-from pymilvus import Collection, utility, connections
-from services.database import get_connection_by_id, connect_to_db
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import ExitStack
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+from pymilvus import Collection
+from core.config import settings
+from core.metrics import UNKNOWN_LABEL, query_cache_hits, query_cache_misses, query_errors, stage_timer
+from services.collection_cache import collection_cache, is_schema_error
+from services.coalescer import search_coalescer
+from services.collection_registry import collection_registry
+from services.connection_pool import connection_manager
+from services.local_engine import local_engine, is_local
+from services.database import get_connection_by_id
+from services.result_cache import result_cache
+from services.search_profiles import resolve_search_params
+from services.vector_files import iter_vector_batches
+from services.merge import merge_top_k
+from services.serialization import marshal_hits
+from services.single_flight import single_flight
+from services.slow_query_log import slow_query_log
 from schemas.query import QueryResult, MultiDatabaseQueryResult
 
-def convert_numpy_types(obj):
-    """递归转换NumPy类型为Python原生类型"""
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {k: convert_numpy_types(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(item) for item in obj]
-    elif isinstance(obj, tuple):
-        return tuple(convert_numpy_types(item) for item in obj)
-    else:
-        return obj
+logger = logging.getLogger(__name__)
+
+# 多数据库查询共享的有界线程池，超时的查询不会阻塞后续请求的返回
+_multi_db_executor = ThreadPoolExecutor(
+    max_workers=settings.MULTI_DB_MAX_WORKERS,
+    thread_name_prefix="multi-db-query"
+)
+
+def normalize_vector_data(vector_data: Union[List[float], List[List[float]], np.ndarray]) -> np.ndarray:
+    """将单个向量、向量列表或NumPy数组统一为float32的(nq × dim)数组，已是float32数组时不复制"""
+    try:
+        vectors = np.asarray(vector_data, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise ValueError("向量数据格式无效")
+    if vectors.ndim == 1:
+        # 单个向量，转为(1 × dim)
+        vectors = vectors.reshape(1, -1)
+    if vectors.ndim != 2 or vectors.size == 0:
+        raise ValueError("向量数据不能为空")
+    return vectors
+
+def grouped_hits(result: QueryResult) -> List[List[Dict[str, Any]]]:
+    """按查询向量分组返回查询结果"""
+    if result.batch_results is not None:
+        return result.batch_results
+    return [result.results]
+
+def _time_left(deadline: Optional[float]) -> Optional[float]:
+    """距截止时间的剩余秒数，用作Milvus调用的timeout；没有截止时间时返回None，已超时时报错"""
+    if deadline is None:
+        return None
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise ValueError("查询超时")
+    return remaining
+
+def _search_loaded(
+    connection: Dict[str, Any],
+    alias: str,
+    collection: Collection,
+    search_kwargs: Dict[str, Any],
+    stages: Optional[Dict[str, float]] = None,
+    deadline: Optional[float] = None
+) -> Tuple[Any, bool]:
+    """确保集合已加载后执行查询，返回查询结果及是否跳过了load()
+
+    提供deadline时，加载和查询都只等待到截止时间，超时的调用不会一直占用线程。
+    """
+    with ExitStack() as stack:
+        with stage_timer("load", connection["id"], collection.name, stages):
+            load_skipped = stack.enter_context(
+                collection_registry.pin(connection, alias, collection, timeout=_time_left(deadline))
+            )
+        # 执行查询，nq个向量在一次search调用中完成
+        with stage_timer("search", connection["id"], collection.name, stages):
+            return collection.search(**search_kwargs, timeout=_time_left(deadline)), load_skipped
+
+def _coalesce_key(database_id: str, collection_name: str, search_kwargs: Dict[str, Any]) -> Tuple:
+    """可以合并执行的查询必须在同一集合、同一向量字段上使用相同的参数、top_k和输出字段"""
+    return (
+        database_id,
+        collection_name,
+        search_kwargs["anns_field"],
+        json.dumps(search_kwargs["param"], sort_keys=True, default=str),
+        search_kwargs["limit"],
+        tuple(search_kwargs["output_fields"] or ()),
+        search_kwargs.get("consistency_level")
+    )
+
+def _search_coalesced(
+    connection: Dict[str, Any],
+    alias: str,
+    collection: Collection,
+    search_kwargs: Dict[str, Any],
+    stages: Dict[str, float],
+    details: Dict[str, Any]
+) -> Tuple[List[Any], bool]:
+    """启用查询合并时与相同参数的并发查询合并为一次search调用，返回本请求的结果及是否跳过了load()
+
+    合并执行时无法区分各请求的加载耗时，search阶段包含等待合并窗口、加载和查询的时间。
+    """
+    deadline = details.get("deadline")
+    if not search_coalescer.enabled:
+        return _search_loaded(connection, alias, collection, search_kwargs, stages, deadline)
+    leader: Dict[str, bool] = {}
+
+    def execute(data: np.ndarray) -> Any:
+        # 只在第一个加入批次的请求中执行
+        search_result, leader["load_skipped"] = _search_loaded(
+            connection, alias, collection, {**search_kwargs, "data": data}, deadline=deadline
+        )
+        return search_result
+
+    with stage_timer("search", connection["id"], collection.name, stages):
+        search_result, details["coalesced_requests"] = search_coalescer.search(
+            _coalesce_key(connection["id"], collection.name, search_kwargs), search_kwargs["data"], execute
+        )
+    return search_result, leader.get("load_skipped", True)
+
+def _record_slow_query(
+    kind: str,
+    user: Optional[str],
+    database_ids: List[str],
+    collection_names: List[str],
+    nq: int,
+    top_k: int,
+    search_params: Optional[Dict[str, Any]],
+    duration: float,
+    stages: Dict[str, float],
+    result_count: int,
+    **extra: Any
+) -> None:
+    """提交一条慢查询记录，由后台线程写入日志"""
+    slow_query_log.record({
+        "kind": kind,
+        "user": user,
+        "databases": database_ids,
+        "collections": collection_names,
+        "nq": nq,
+        "top_k": top_k,
+        "search_params": search_params,
+        "duration": duration,
+        "stages": dict(stages),
+        "result_count": result_count,
+        **extra
+    })
+
+def _query_profile(stages: Dict[str, float], details: Dict[str, Any]) -> Dict[str, Any]:
+    """单次查询的分阶段耗时：连接是复用还是等待了重连、是否跳过load()、Milvus查询及结果转换耗时"""
+    return {
+        "stages": dict(stages),
+        "connection_reused": details.get("connection_reused"),
+        "load_skipped": details.get("load_skipped"),
+        "load_retried": details.get("load_retried", False),
+        "coalesced_requests": details.get("coalesced_requests", 1),
+        "cache_hit": details["cache_hit"]
+    }
+
+def _search_milvus(
+    connection: Dict[str, Any],
+    collection_name: str,
+    vector_data: np.ndarray,
+    top_k: int,
+    search_params: Optional[Dict[str, Any]],
+    output_fields: Optional[List[str]],
+    anns_field: Optional[str],
+    stages: Dict[str, float],
+    details: Dict[str, Any]
+) -> Tuple[List[List[Dict[str, Any]]], str, Dict[str, Any]]:
+    """在Milvus集合上查询，返回按查询向量分组的结果、向量字段和实际使用的查询参数"""
+    database_id = connection["id"]
+    labels = details["labels"]
+    # 从连接池取用已建立的连接
+    with ExitStack() as stack:
+        with stage_timer("connect", stages=stages, **labels):
+            alias = stack.enter_context(
+                connection_manager.acquire(connection, details, timeout=_time_left(details.get("deadline")))
+            )
+        # 获取缓存的集合句柄和结构信息，维度校验无需访问服务端
+        with stage_timer("schema", stages=stages, **labels):
+            info, collection = collection_cache.get(database_id, alias, collection_name)
+        labels["collection"] = collection_name
+        field_name, field_info = info.vector_field(anns_field)
+        info.validate_dimension(vector_data, field_name)
+
+        # 准备查询参数，未指定度量类型时使用索引的度量类型
+        search_params = dict(search_params or {})
+        search_params.setdefault("metric_type", field_info["metric_type"] or "L2")
+        search_kwargs = {
+            "data": vector_data,
+            "anns_field": field_name,
+            "param": {key: value for key, value in search_params.items() if key != "consistency_level"},
+            "limit": top_k,
+            "output_fields": output_fields
+        }
+        if search_params.get("consistency_level"):
+            search_kwargs["consistency_level"] = search_params["consistency_level"]
+        try:
+            search_result, load_skipped = _search_coalesced(connection, alias, collection, search_kwargs, stages, details)
+        except Exception as e:
+            if is_schema_error(e):
+                # 集合已被删除或修改，清除缓存的结构信息和加载记录
+                collection_cache.invalidate(database_id, collection_name)
+                collection_registry.forget(database_id, collection_name)
+                result_cache.invalidate(database_id, collection_name)
+                raise
+            if "not loaded" not in str(e).lower():
+                raise
+            # 集合已被外部释放，清除加载记录后重新加载
+            collection_registry.forget(database_id, collection_name)
+            details["load_retried"] = True
+            search_result, load_skipped = _search_loaded(
+                connection, alias, collection, search_kwargs, stages, details.get("deadline")
+            )
+        details["load_skipped"] = load_skipped
+    
+    # 处理结果，按查询向量分组
+    with stage_timer("convert", database_id, collection_name, stages):
+        batch_results = [marshal_hits(hits, output_fields) for hits in search_result]
+    
+    return batch_results, field_name, search_params
+
+def _search_local(
+    connection: Dict[str, Any],
+    collection_name: str,
+    vector_data: np.ndarray,
+    top_k: int,
+    search_params: Optional[Dict[str, Any]],
+    output_fields: Optional[List[str]],
+    anns_field: Optional[str],
+    stages: Dict[str, float],
+    details: Dict[str, Any]
+) -> Tuple[List[List[Dict[str, Any]]], str, Dict[str, Any]]:
+    """在本地集合上精确查询，未指定度量类型时使用集合元数据中的度量类型"""
+    database_id = connection["id"]
+    labels = details["labels"]
+    with stage_timer("schema", stages=stages, **labels):
+        collection = local_engine.get(connection, collection_name)
+    labels["collection"] = collection_name
+    field_name = collection.vector_field(anns_field)
+    collection.validate_dimension(vector_data)
+
+    search_params = dict(search_params or {})
+    search_params.setdefault("metric_type", collection.metric_type)
+    # 向量文件以内存映射方式读取，不存在加载步骤
+    details["load_skipped"] = True
+    with stage_timer("search", database_id, collection_name, stages):
+        # 合并后的一次矩阵乘法同样比逐个查询更充分地利用BLAS
+        batch_results, details["coalesced_requests"] = search_coalescer.search(
+            ("local", database_id, collection_name, search_params["metric_type"], top_k, tuple(output_fields or ())),
+            vector_data,
+            lambda data: local_engine.search(
+                connection, collection_name, data, top_k, search_params["metric_type"], output_fields
+            )
+        )
+    return batch_results, field_name, search_params
 
 def execute_vector_query(
     database_id: str,
     collection_name: str,
-    vector_data: Union[List[float], List[List[float]]],
+    vector_data: Union[List[float], List[List[float]], np.ndarray],
+    top_k: int = 10,
+    search_params: Optional[Dict[str, Any]] = None,
+    output_fields: Optional[List[str]] = None,
+    anns_field: Optional[str] = None,
+    use_cache: bool = True,
+    profile: bool = False,
+    user: Optional[str] = None,
+    search_profile: Optional[str] = None,
+    deadline: Optional[float] = None
+) -> QueryResult:
+    """在指定数据库和集合上执行向量查询，profile为True时在metrics中返回分阶段耗时
+
+    search_profile为集合的命名查询参数配置，未指定配置和search_params时使用集合的默认配置。
+    deadline为截止时间(time.time())，获取连接、加载集合和查询都只等待到该时间。
+    与进行中的完全相同的查询共享一次执行的结果。
+    """
+    query_args = {
+        "database_id": database_id,
+        "collection_name": collection_name,
+        "vector_data": vector_data,
+        "top_k": top_k,
+        "search_params": search_params,
+        "output_fields": output_fields,
+        "anns_field": anns_field,
+        "use_cache": use_cache,
+        "profile": profile,
+        "user": user,
+        "search_profile": search_profile,
+        "deadline": deadline
+    }
+    if not single_flight.enabled:
+        return _execute_vector_query(**query_args)
+    try:
+        vectors = normalize_vector_data(vector_data)
+    except ValueError:
+        return _execute_vector_query(**query_args)
+    # 用户只用于慢查询记录，不影响结果
+    key = single_flight.make_key("vector", [
+        database_id, collection_name, top_k, search_params, search_profile, output_fields, anns_field, profile
+    ], vectors)
+    result, shared = single_flight.do("vector", key, lambda: _execute_vector_query(**{**query_args, "vector_data": vectors}))
+    if shared:
+        return result.copy(update={"metrics": {**result.metrics, "single_flight_shared": True}})
+    return result
+
+def _execute_vector_query(
+    database_id: str,
+    collection_name: str,
+    vector_data: Union[List[float], List[List[float]], np.ndarray],
     top_k: int = 10,
     search_params: Optional[Dict[str, Any]] = None,
-    output_fields: Optional[List[str]] = None
+    output_fields: Optional[List[str]] = None,
+    anns_field: Optional[str] = None,
+    use_cache: bool = True,
+    profile: bool = False,
+    user: Optional[str] = None,
+    search_profile: Optional[str] = None,
+    deadline: Optional[float] = None
 ) -> QueryResult:
-    """在指定数据库和集合上执行向量查询"""
+    # 各阶段耗时(秒)及连接复用、load跳过等情况
+    stages: Dict[str, float] = {}
+    # 指标标签在数据库连接和集合确认存在后才使用请求中的值
+    labels = {"database": UNKNOWN_LABEL, "collection": UNKNOWN_LABEL}
+    details: Dict[str, Any] = {"cache_hit": False, "labels": labels, "deadline": deadline}
+    request_start = time.time()
+    nq = 0
     try:
         # 检查连接是否存在
-        connection = get_connection_by_id(database_id)
+        with stage_timer("metadata", stages=stages, **labels):
+            connection = get_connection_by_id(database_id)
         if not connection:
             raise ValueError("数据库连接不存在")
+        labels["database"] = database_id
+        # 配置来自已缓存的连接元数据
+        search_params, profile_name = resolve_search_params(
+            connection, collection_name, search_profile, search_params
+        )
         
-        alias = f"conn_{database_id}"
-        # 确保连接
-        if not connections.has_connection(alias):
-            connect_to_db(database_id)
-            
-        # 准备查询参数
-        if search_params is None:
-            search_params = {"metric_type": "L2"}
-        print(11)
-        print(vector_data)
-        if not isinstance(vector_data[0], list):
-            # 单个向量，转为列表
-            vector_data = [vector_data]
-        
-    # try:
         start_time = time.time()
+        vector_data = normalize_vector_data(vector_data)
+        nq = len(vector_data)
         
-        # 获取集合
-        collection = Collection(collection_name, using=alias)
-        collection.load()
-        print(1)
-        # 执行查询
-        search_result = collection.search(
-            data=vector_data,
-            anns_field="emb",  # 假设向量字段名为"vector"
-            param=search_params,
-            limit=top_k,
-            output_fields=output_fields
-        )
+        # 相同查询直接返回缓存结果
+        cache_key = None
+        if use_cache and result_cache.enabled:
+            cache_key = result_cache.make_key(
+                database_id, collection_name, vector_data, top_k, search_params, output_fields, anns_field
+            )
+            with stage_timer("cache", stages=stages, **labels):
+                cached = result_cache.get(cache_key)
+            if cached is None:
+                query_cache_misses.inc(**labels)
+            else:
+                # 只有成功的查询结果会被缓存，集合名称已确认存在
+                labels["collection"] = collection_name
+                query_cache_hits.inc(**labels)
+                details["cache_hit"] = True
+                metrics = {
+                    **cached.metrics,
+                    "execution_time": time.time() - start_time,
+                    "cache_hit": True
+                }
+                if profile:
+                    metrics["profile"] = _query_profile(stages, details)
+                return cached.copy(update={"metrics": metrics})
         
-        # 处理结果
-        results = []
-        for hits in search_result:
-            for hit in hits:
-                hit_data = {"id": hit.id, "distance": hit.distance}
-                if output_fields:
-                    for field in output_fields:
-                        if hasattr(hit, "entity"):
-                            # 转换NumPy类型为Python原生类型
-                            value = hit.entity.get(field)
-                            hit_data[field] = convert_numpy_types(value)
-                results.append(hit_data)
+        if is_local(connection):
+            batch_results, field_name, search_params = _search_local(
+                connection, collection_name, vector_data, top_k, search_params, output_fields, anns_field,
+                stages, details
+            )
+        else:
+            batch_results, field_name, search_params = _search_milvus(
+                connection, collection_name, vector_data, top_k, search_params, output_fields, anns_field,
+                stages, details
+            )
         
         end_time = time.time()
         execution_time = end_time - start_time
-        print("result:", results)
-        # 返回结果
-        return QueryResult(
+        total_results = sum(len(query_hits) for query_hits in batch_results)
+        # 返回结果：单个向量时结果放在results中，批量查询时按查询向量分组放在batch_results中
+        # 结果已是原生类型，直接构造模型，不再逐条校验
+        result = QueryResult.construct(
             database_id=database_id,
             collection_name=collection_name,
-            results=results,
+            results=batch_results[0] if nq == 1 else [],
+            batch_results=batch_results if nq > 1 else None,
             metrics={
                 "execution_time": execution_time,
-                "total_results": len(results)
+                "anns_field": field_name,
+                "metric_type": search_params["metric_type"],
+                "search_profile": profile_name,
+                "load_skipped": details["load_skipped"],
+                "cache_hit": False,
+                "nq": nq,
+                "total_results": total_results
             }
         )
+        if cache_key is not None:
+            result_cache.put(cache_key, database_id, collection_name, result)
+        if slow_query_log.is_slow(execution_time):
+            _record_slow_query(
+                "vector", user, [database_id], [collection_name], nq, top_k, search_params,
+                execution_time, stages, total_results
+            )
+        if profile:
+            # 缓存中的结果不带本次请求的分阶段耗时
+            return result.copy(update={"metrics": {**result.metrics, "profile": _query_profile(stages, details)}})
+        return result
     except Exception as e:
-        print(e)
+        logger.error(f"数据库 {database_id} 集合 {collection_name} 查询失败: {e}")
+        query_errors.inc(**labels)
+        duration = time.time() - request_start
+        if slow_query_log.is_slow(duration):
+            _record_slow_query(
+                "vector", user, [database_id], [collection_name], nq, top_k, search_params,
+                duration, stages, 0, error=str(e)
+            )
         raise ValueError(f"查询执行失败: {str(e)}")
 
-def execute_multi_db_query(
+def execute_vector_file_query(
+    database_id: str,
+    collection_name: str,
+    vectors: np.ndarray,
+    top_k: int = 10,
+    batch_size: int = 1000,
+    search_params: Optional[Dict[str, Any]] = None,
+    output_fields: Optional[List[str]] = None,
+    anns_field: Optional[str] = None,
+    profile: bool = False,
+    user: Optional[str] = None,
+    search_profile: Optional[str] = None
+) -> QueryResult:
+    """对(可能是内存映射的)向量数组按批次执行查询，并按查询向量合并结果"""
+    start_time = time.time()
+    batch_results = []
+    batches = 0
+    search_time = 0.0
+    metrics: Dict[str, Any] = {}
+    stages: Dict[str, float] = {}
+    for batch in iter_vector_batches(vectors, batch_size):
+        result = execute_vector_query(
+            database_id=database_id,
+            collection_name=collection_name,
+            vector_data=batch,
+            top_k=top_k,
+            search_params=search_params,
+            output_fields=output_fields,
+            anns_field=anns_field,
+            use_cache=False,
+            profile=profile,
+            user=user,
+            search_profile=search_profile
+        )
+        batch_results.extend(grouped_hits(result))
+        search_time += result.metrics["execution_time"]
+        metrics = result.metrics
+        batches += 1
+        if profile:
+            for stage, elapsed in result.metrics["profile"]["stages"].items():
+                stages[stage] = stages.get(stage, 0.0) + elapsed
+
+    nq = len(batch_results)
+    result = QueryResult.construct(
+        database_id=database_id,
+        collection_name=collection_name,
+        results=batch_results[0] if nq == 1 else [],
+        batch_results=batch_results if nq > 1 else None,
+        metrics={
+            "execution_time": time.time() - start_time,
+            "search_time": search_time,
+            "anns_field": metrics.get("anns_field"),
+            "metric_type": metrics.get("metric_type"),
+            "search_profile": metrics.get("search_profile"),
+            "batches": batches,
+            "batch_size": batch_size,
+            "nq": nq,
+            "total_results": sum(len(query_hits) for query_hits in batch_results)
+        }
+    )
+    if profile:
+        # 各批次的分阶段耗时之和
+        result.metrics["profile"] = {"stages": stages, "batches": batches}
+    return result
+
+def _merge_database_results(
+    database_ids: List[str],
+    results: Dict[str, QueryResult],
+    nq: int,
+    top_k: int,
+    search_params: Optional[Dict[str, Any]]
+) -> List[List[Dict[str, Any]]]:
+    """对每个查询向量，分别对各数据库已排序的结果做k路归并，只生成最终的top_k条结果"""
+    succeeded_ids = [db_id for db_id in database_ids if db_id in results]
+    per_database_hits = {db_id: grouped_hits(results[db_id]) for db_id in succeeded_ids}
+    # 排序方向以实际使用的度量类型为准(未指定时来自各集合的索引)
+    metric_type = (search_params or {}).get("metric_type")
+    if metric_type is None and succeeded_ids:
+        metric_type = results[succeeded_ids[0]].metrics.get("metric_type")
+    return [
+        merge_top_k(
+            [
+                (db_id, results[db_id].collection_name, per_database_hits[db_id][query_index])
+                for db_id in succeeded_ids
+            ],
+            top_k,
+            metric_type
+        )
+        for query_index in range(nq)
+    ]
+
+def iter_multi_db_query(
     database_ids: List[str],
     collection_names: Dict[str, str],
-    vector_data: Union[List[float], List[List[float]]],
+    vector_data: Union[List[float], List[List[float]], np.ndarray],
     top_k: int = 10,
     search_params: Optional[Dict[str, Any]] = None,
-    output_fields: Optional[List[str]] = None
-) -> MultiDatabaseQueryResult:
-    """在多个数据库上执行查询并合并结果"""
-    print("service")
-    print("multi:", database_ids, collection_names, vector_data)
+    output_fields: Optional[List[str]] = None,
+    anns_field: Optional[str] = None,
+    use_cache: bool = True,
+    timeout: Optional[float] = None,
+    database_timeouts: Optional[Dict[str, float]] = None,
+    progressive: bool = False,
+    profile: bool = False,
+    user: Optional[str] = None,
+    search_profile: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """在多个数据库上并发执行查询，按完成顺序逐个产生事件
 
+    - database: 某个数据库的查询结果
+    - error: 某个数据库查询失败或超时
+    - partial: 仅progressive为True时产生，已完成数据库的合并top_k结果
+    - final: 最终的MultiDatabaseQueryResult
+
+    profile为True时，各数据库的结果及最终结果的metrics中包含分阶段耗时。
+    """
     start_time = time.time()
+    stages: Dict[str, float] = {}
     results = {}
     errors = []
-    
-    # 对每个数据库执行查询
+    timed_out_databases = []
+    database_latencies = {}
+
+    vector_data = normalize_vector_data(vector_data)
+    nq = len(vector_data)
+    default_timeout = timeout if timeout is not None else settings.MULTI_DB_QUERY_TIMEOUT
+    database_timeouts = database_timeouts or {}
+
+    # 并发提交各数据库的查询，每个数据库有独立的截止时间
+    futures = {}
+    deadlines = {}
+    submitted_at = {}
+    finished_at = {}
+    missing_collections = []
     for db_id in database_ids:
-        try:
-            print("for start")
-            collection_name = collection_names.get(db_id)
-            print(collection_name)
-            if not collection_name:
-                errors.append(f"数据库ID {db_id} 未提供集合名称")
-                continue
-            print(1)
-            query_result = execute_vector_query(
-                database_id=db_id,
-                collection_name=collection_name,
-                vector_data=vector_data,
-                top_k=top_k,
-                search_params=search_params,
-                output_fields=output_fields
-            )
-            print(2)
-            # print("multi:", db_id, query_result)
-            results[db_id] = query_result
-            print(3)
-        except Exception as e:
-            errors.append(f"数据库 {db_id} 查询失败: {str(e)}")
-    
-    # 聚合结果
-    all_results = []
-    for db_id, result in results.items():
-        for item in result.results:
-            # 确保所有数据都被转换为JSON可序列化的类型
-            processed_item = convert_numpy_types({
-                "database_id": db_id,
-                "collection_name": result.collection_name,
-                **item
-            })
-            all_results.append(processed_item)
-    
-    # 根据距离排序
-    all_results.sort(key=lambda x: x["distance"])
-    # 保留前top_k个结果
-    all_results = all_results[:top_k]
+        collection_name = collection_names.get(db_id)
+        if not collection_name:
+            missing_collections.append(db_id)
+            continue
+
+        submitted_at[db_id] = time.time()
+        deadline = submitted_at[db_id] + database_timeouts.get(db_id, default_timeout)
+        future = _multi_db_executor.submit(
+            execute_vector_query,
+            database_id=db_id,
+            collection_name=collection_name,
+            vector_data=vector_data,
+            top_k=top_k,
+            search_params=search_params,
+            output_fields=output_fields,
+            anns_field=anns_field,
+            use_cache=use_cache,
+            profile=profile,
+            user=user,
+            search_profile=search_profile,
+            deadline=deadline
+        )
+        future.add_done_callback(
+            lambda f, db_id=db_id: finished_at.setdefault(db_id, time.time())
+        )
+        futures[future] = db_id
+        deadlines[future] = deadline
+
+    pending = set(futures)
+    try:
+        for db_id in missing_collections:
+            errors.append(f"数据库ID {db_id} 未提供集合名称")
+            yield {"event": "error", "database_id": db_id, "error": errors[-1]}
+
+        # 等待查询完成，超过截止时间的数据库记为超时
+        while pending:
+            now = time.time()
+            expired = {f for f in pending if deadlines[f] <= now}
+            for future in expired:
+                db_id = futures[future]
+                # 尚未开始执行的查询直接取消；已在执行的查询在截止时间后由Milvus调用的timeout结束，结果被丢弃
+                future.cancel()
+                timed_out_databases.append(db_id)
+                database_latencies[db_id] = now - submitted_at[db_id]
+                errors.append(f"数据库 {db_id} 查询超时")
+                yield {"event": "error", "database_id": db_id, "error": errors[-1], "timed_out": True}
+            pending -= expired
+            if not pending:
+                break
+
+            next_deadline = min(deadlines[f] for f in pending)
+            done, pending = wait(pending, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+            completed = False
+            for future in done:
+                db_id = futures[future]
+                database_latencies[db_id] = finished_at.get(db_id, time.time()) - submitted_at[db_id]
+                try:
+                    results[db_id] = future.result()
+                except Exception as e:
+                    errors.append(f"数据库 {db_id} 查询失败: {str(e)}")
+                    yield {"event": "error", "database_id": db_id, "error": errors[-1]}
+                    continue
+                completed = True
+                yield {"event": "database", "database_id": db_id, "result": results[db_id]}
+
+            # 还有数据库未完成时，发送目前为止的合并结果
+            if progressive and completed and pending:
+                partial = _merge_database_results(database_ids, results, nq, top_k, search_params)
+                yield {
+                    "event": "partial",
+                    "completed_databases": len(results),
+                    "pending_databases": len(pending),
+                    "aggregated_results": partial[0] if nq == 1 else [],
+                    "batch_aggregated_results": partial if nq > 1 else None
+                }
+    finally:
+        # 调用方提前停止(如流式响应的客户端断开)时，取消尚未开始的查询
+        for future in pending:
+            future.cancel()
+
+    stages["wait"] = time.time() - start_time
+    with stage_timer("merge", stages=stages):
+        batch_aggregated_results = _merge_database_results(database_ids, results, nq, top_k, search_params)
     
     end_time = time.time()
     total_time = end_time - start_time
     
-    return MultiDatabaseQueryResult(
-        results=results,
-        aggregated_results=all_results,
-        metrics={
-            "total_execution_time": total_time,
-            "database_count": len(results),
-            "errors": errors,
-            "total_results": len(all_results)
+    metrics = {
+        "total_execution_time": total_time,
+        "database_count": len(results),
+        "errors": errors,
+        "timed_out_databases": timed_out_databases,
+        "database_latencies": database_latencies,
+        "nq": nq,
+        "total_results": sum(len(query_hits) for query_hits in batch_aggregated_results)
+    }
+    if slow_query_log.is_slow(total_time):
+        # 各数据库自身的慢查询另有记录，这里记录整体耗时和各数据库的延迟
+        queried_ids = [db_id for db_id in database_ids if collection_names.get(db_id)]
+        _record_slow_query(
+            "multi", user, queried_ids, [collection_names[db_id] for db_id in queried_ids], nq, top_k,
+            search_params, total_time, stages, metrics["total_results"],
+            database_latencies=database_latencies, errors=errors
+        )
+    if profile:
+        # wait为等待各数据库返回的总耗时，各数据库的分阶段耗时见databases
+        metrics["profile"] = {
+            "stages": stages,
+            "databases": {
+                db_id: {
+                    "latency": latency,
+                    **(results[db_id].metrics.get("profile", {}) if db_id in results else {"failed": True})
+                }
+                for db_id, latency in database_latencies.items()
+            }
         }
-    ) 
\ No newline at end of file
+    yield {"event": "final", "result": MultiDatabaseQueryResult.construct(
+        results=results,
+        aggregated_results=batch_aggregated_results[0] if nq == 1 else [],
+        batch_aggregated_results=batch_aggregated_results if nq > 1 else None,
+        metrics=metrics
+    )}
+
+def execute_multi_db_query(
+    database_ids: List[str],
+    collection_names: Dict[str, str],
+    vector_data: Union[List[float], List[List[float]], np.ndarray],
+    top_k: int = 10,
+    search_params: Optional[Dict[str, Any]] = None,
+    output_fields: Optional[List[str]] = None,
+    anns_field: Optional[str] = None,
+    use_cache: bool = True,
+    timeout: Optional[float] = None,
+    database_timeouts: Optional[Dict[str, float]] = None,
+    profile: bool = False,
+    user: Optional[str] = None,
+    search_profile: Optional[str] = None
+) -> MultiDatabaseQueryResult:
+    """在多个数据库上并发执行查询并合并结果，超时的数据库只返回部分结果
+
+    与进行中的完全相同的查询共享一次执行的结果；流式查询(iter_multi_db_query)逐个产生事件，不参与合并。
+    """
+    query_args = {
+        "database_ids": database_ids,
+        "collection_names": collection_names,
+        "vector_data": vector_data,
+        "top_k": top_k,
+        "search_params": search_params,
+        "output_fields": output_fields,
+        "anns_field": anns_field,
+        "use_cache": use_cache,
+        "timeout": timeout,
+        "database_timeouts": database_timeouts,
+        "profile": profile,
+        "user": user,
+        "search_profile": search_profile
+    }
+    if not single_flight.enabled:
+        return _execute_multi_db_query(**query_args)
+    try:
+        vectors = normalize_vector_data(vector_data)
+    except ValueError:
+        return _execute_multi_db_query(**query_args)
+    key = single_flight.make_key("multi", [
+        database_ids, collection_names, top_k, search_params, search_profile, output_fields, anns_field,
+        timeout, database_timeouts, profile
+    ], vectors)
+    result, shared = single_flight.do("multi", key, lambda: _execute_multi_db_query(**{**query_args, "vector_data": vectors}))
+    if shared:
+        return result.copy(update={"metrics": {**result.metrics, "single_flight_shared": True}})
+    return result
+
+def _execute_multi_db_query(
+    database_ids: List[str],
+    collection_names: Dict[str, str],
+    vector_data: Union[List[float], List[List[float]], np.ndarray],
+    top_k: int = 10,
+    search_params: Optional[Dict[str, Any]] = None,
+    output_fields: Optional[List[str]] = None,
+    anns_field: Optional[str] = None,
+    use_cache: bool = True,
+    timeout: Optional[float] = None,
+    database_timeouts: Optional[Dict[str, float]] = None,
+    profile: bool = False,
+    user: Optional[str] = None,
+    search_profile: Optional[str] = None
+) -> MultiDatabaseQueryResult:
+    for event in iter_multi_db_query(
+        database_ids=database_ids,
+        collection_names=collection_names,
+        vector_data=vector_data,
+        top_k=top_k,
+        search_params=search_params,
+        output_fields=output_fields,
+        anns_field=anns_field,
+        use_cache=use_cache,
+        timeout=timeout,
+        database_timeouts=database_timeouts,
+        profile=profile,
+        user=user,
+        search_profile=search_profile
+    ):
+        if event["event"] == "final":
+            return event["result"]
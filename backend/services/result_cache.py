@@ -0,0 +1,151 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Set, Tuple
+import numpy as np
+from core.config import settings
+from core.metrics import registry
+from schemas.query import QueryResult
+
+
+class CachedResult:
+    def __init__(self, result: QueryResult, size: int, expires_at: float, collection_key: Tuple[str, str]):
+        self.result = result
+        self.size = size
+        self.expires_at = expires_at
+        self.collection_key = collection_key
+
+
+class QueryResultCache:
+    """向量查询结果缓存，支持TTL过期、按字节预算的LRU淘汰和按集合失效"""
+
+    def __init__(self, enabled: bool, ttl: float, max_bytes: int):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._by_collection: Dict[Tuple[str, str], Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(
+        database_id: str,
+        collection_name: str,
+        vector_data: np.ndarray,
+        top_k: int,
+        search_params: Optional[Dict[str, Any]],
+        output_fields: Optional[List[str]],
+        anns_field: Optional[str] = None
+    ) -> str:
+        """根据查询参数生成缓存键，向量按float32字节参与哈希"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps(
+            [database_id, collection_name, top_k, search_params, output_fields, anns_field],
+            sort_keys=True,
+            default=str
+        ).encode("utf-8"))
+        digest.update(np.asarray(vector_data, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[QueryResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+
+    def put(self, key: str, database_id: str, collection_name: str, result: QueryResult) -> None:
+        size = _estimate_size(result)
+        if size > self.max_bytes:
+            return
+        collection_key = (database_id, collection_name)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedResult(result, size, time.time() + self.ttl, collection_key)
+            self._by_collection.setdefault(collection_key, set()).add(key)
+            self._bytes += size
+            # 超出字节预算时淘汰最久未使用的结果
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, database_id: Optional[str] = None, collection_name: Optional[str] = None) -> int:
+        """清除缓存结果：指定集合、整个数据库，或全部，返回清除的条数"""
+        with self._lock:
+            if database_id is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._by_collection.clear()
+                self._bytes = 0
+                return count
+            keys = [
+                key
+                for collection_key, keys in self._by_collection.items()
+                if collection_key[0] == database_id and collection_name in (None, collection_key[1])
+                for key in keys
+            ]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+    def _remove(self, key: str) -> None:
+        """移除缓存条目(调用时需持有锁)"""
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        keys = self._by_collection.get(entry.collection_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_collection[entry.collection_key]
+
+
+def _estimate_size(result: QueryResult) -> int:
+    """粗略估算查询结果占用的内存字节数，避免在写入缓存时做完整序列化"""
+    size = 512
+    groups = result.batch_results if result.batch_results is not None else [result.results]
+    for hits in groups:
+        for hit in hits:
+            size += 120 + 64 * len(hit)
+    return size
+
+
+result_cache = QueryResultCache(
+    enabled=settings.QUERY_CACHE_ENABLED,
+    ttl=settings.QUERY_CACHE_TTL,
+    max_bytes=settings.QUERY_CACHE_MAX_MB * 1024 * 1024
+)
+
+registry.gauge(
+    "fedui_result_cache",
+    "Query result cache entries and bytes",
+    ("kind",),
+    lambda: [(("entries",), result_cache.stats()["entries"]), (("bytes",), result_cache.stats()["bytes"])]
+)
@@ -0,0 +1,149 @@
+import copy
+from typing import Callable, Dict, Any, Optional, Tuple
+from core.metadata_store import metadata_store
+
+# 指向查询参数评估为该集合推荐的参数(见services.evaluation)
+RECOMMENDED_PROFILE = "recommended"
+# 对数据库中所有集合生效的配置，集合自己的同名配置优先
+ALL_COLLECTIONS = "*"
+
+
+def get_search_profiles(connection_id: str) -> Dict[str, Dict[str, Any]]:
+    """数据库连接上按集合保存的查询参数配置: {集合名称或"*": {"profiles": {名称: 参数}, "default": 名称}}"""
+    connection = metadata_store.get_connection(connection_id)
+    if not connection:
+        raise ValueError("数据库连接不存在")
+    return copy.deepcopy(connection.get("search_profiles") or {})
+
+
+def _modify_search_profiles(
+    connection_id: str,
+    modify: Callable[[Dict[str, Any], Dict[str, Any]], bool]
+) -> Dict[str, Any]:
+    """在元数据存储的锁内读-改-写连接的search_profiles，并发修改不会互相覆盖
+
+    modify接收(连接, 配置)并就地修改配置，返回是否有修改；返回修改后的全部配置。
+    """
+    result: Dict[str, Any] = {}
+
+    def apply(connection: Dict[str, Any]) -> Dict[str, Any]:
+        profiles = connection.get("search_profiles") or {}
+        changed = modify(connection, profiles)
+        result.update(profiles)
+        return {"search_profiles": profiles} if changed else {}
+
+    if metadata_store.modify_connection(connection_id, apply) is None:
+        raise ValueError("数据库连接不存在")
+    return result
+
+
+def save_search_profile(connection_id: str, collection_name: str, name: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """新增或替换一个命名配置"""
+    if name == RECOMMENDED_PROFILE:
+        raise ValueError(f"配置名称 {RECOMMENDED_PROFILE} 保留给查询参数评估的推荐结果")
+
+    def modify(connection: Dict[str, Any], profiles: Dict[str, Any]) -> bool:
+        entry = profiles.setdefault(collection_name, {"profiles": {}, "default": None})
+        entry["profiles"][name] = profile
+        return True
+
+    return _modify_search_profiles(connection_id, modify)[collection_name]
+
+
+def delete_search_profile(connection_id: str, collection_name: str, name: str) -> bool:
+    deleted = False
+
+    def modify(connection: Dict[str, Any], profiles: Dict[str, Any]) -> bool:
+        nonlocal deleted
+        entry = profiles.get(collection_name)
+        if not entry or name not in entry["profiles"]:
+            return False
+        del entry["profiles"][name]
+        if entry.get("default") == name:
+            entry["default"] = None
+        if not entry["profiles"] and not entry.get("default"):
+            del profiles[collection_name]
+        deleted = True
+        return True
+
+    _modify_search_profiles(connection_id, modify)
+    return deleted
+
+
+def set_default_search_profile(connection_id: str, collection_name: str, name: Optional[str]) -> Dict[str, Any]:
+    """设置未指定配置和查询参数的请求自动使用的配置，name为空时取消"""
+
+    def modify(connection: Dict[str, Any], profiles: Dict[str, Any]) -> bool:
+        if name is not None:
+            _lookup_profile(connection, collection_name, name)
+        entry = profiles.setdefault(collection_name, {"profiles": {}, "default": None})
+        entry["default"] = name
+        return True
+
+    return _modify_search_profiles(connection_id, modify)[collection_name]
+
+
+def resolve_search_params(
+    connection: Dict[str, Any],
+    collection_name: str,
+    search_profile: Optional[str],
+    search_params: Optional[Dict[str, Any]]
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """按配置名称得到实际的查询参数，返回(查询参数, 使用的配置名称)
+
+    配置直接从已缓存的连接元数据中读取，不产生额外I/O。请求中的search_params覆盖配置中的同名参数；
+    既未指定配置也未提供search_params时使用集合(或"*")的默认配置。
+    """
+    if search_profile is None:
+        if search_params is not None:
+            return search_params, None
+        search_profile = _default_profile(connection, collection_name)
+        if search_profile is None:
+            return search_params, None
+    resolved = copy.deepcopy(_lookup_profile(connection, collection_name, search_profile))
+    for key, value in (search_params or {}).items():
+        if key == "params" and isinstance(value, dict):
+            resolved["params"] = {**resolved.get("params", {}), **value}
+        else:
+            resolved[key] = value
+    return resolved, search_profile
+
+
+def profile_to_search_params(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """将SearchProfile转换为Milvus的查询参数格式: {"metric_type", "params": {"nprobe"/"ef"...}, "consistency_level"}"""
+    params = dict(profile.get("params") or {})
+    for key in ("nprobe", "ef"):
+        if profile.get(key) is not None:
+            params[key] = profile[key]
+    search_params: Dict[str, Any] = {}
+    if profile.get("metric_type"):
+        search_params["metric_type"] = profile["metric_type"].upper()
+    if params:
+        search_params["params"] = params
+    if profile.get("consistency_level"):
+        search_params["consistency_level"] = profile["consistency_level"]
+    return search_params
+
+
+def _lookup_profile(connection: Dict[str, Any], collection_name: str, name: str) -> Dict[str, Any]:
+    profiles = connection.get("search_profiles") or {}
+    for key in (collection_name, ALL_COLLECTIONS):
+        profile = (profiles.get(key) or {}).get("profiles", {}).get(name)
+        if profile is not None:
+            return profile
+    if name == RECOMMENDED_PROFILE:
+        recommended = (connection.get("recommended_search_params") or {}).get(collection_name)
+        if recommended is not None:
+            return recommended["search_params"]
+        raise ValueError(f"集合 {collection_name} 还没有评估推荐的查询参数")
+    raise ValueError(f"集合 {collection_name} 没有名为 {name} 的查询参数配置")
+
+
+def _default_profile(connection: Dict[str, Any], collection_name: str) -> Optional[str]:
+    profiles = connection.get("search_profiles") or {}
+    for key in (collection_name, ALL_COLLECTIONS):
+        default = (profiles.get(key) or {}).get("default")
+        if default:
+            return default
+    return None
+
@@ -0,0 +1,229 @@
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import numpy as np
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+from core.metrics import stage_timer
+from schemas.query import QueryResult, MultiDatabaseQueryResult
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow为可选依赖，未安装时不支持Arrow格式
+    pa = None
+
+# orjson直接序列化NumPy数组，字典键允许为非字符串
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# 查询结果的响应格式，通过Accept请求头协商
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.fedui.columnar+json"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+RESPONSE_FORMATS = {
+    JSON_MEDIA_TYPE: "json",
+    COLUMNAR_JSON_MEDIA_TYPE: "columnar",
+    ARROW_STREAM_MEDIA_TYPE: "arrow"
+}
+
+
+def convert_numpy_types(obj):
+    """递归转换NumPy类型为Python原生类型"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {k: convert_numpy_types(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_numpy_types(item) for item in obj]
+    elif isinstance(obj, tuple):
+        return tuple(convert_numpy_types(item) for item in obj)
+    else:
+        return obj
+
+
+def _native_column(values: List[Any]) -> List[Any]:
+    """把一列字段值转换为Python原生类型：同类NumPy标量整列一次转换，原生类型原样返回"""
+    if not values:
+        return values
+    if all(isinstance(value, np.generic) for value in values):
+        return np.asarray(values).tolist()
+    if any(isinstance(value, (np.generic, np.ndarray, dict, list, tuple)) for value in values):
+        return [convert_numpy_types(value) for value in values]
+    return values
+
+
+def marshal_hits(hits: Any, output_fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """把一个查询向量的pymilvus结果转换为结果字典列表
+
+    ID和距离整列取出并一次性转换为原生类型，输出字段也按列转换，
+    不再对每条结果逐个递归转换。
+    """
+    ids = np.asarray(hits.ids).tolist()
+    distances = np.asarray(hits.distances, dtype=np.float64).tolist()
+    if not output_fields:
+        return [{"id": hit_id, "distance": distance} for hit_id, distance in zip(ids, distances)]
+
+    columns = []
+    for field in output_fields:
+        values = [hit.entity.get(field) if hasattr(hit, "entity") else None for hit in hits]
+        columns.append(_native_column(values))
+    return [
+        {"id": hit_id, "distance": distance, **dict(zip(output_fields, row))}
+        for hit_id, distance, row in zip(ids, distances, zip(*columns))
+    ]
+
+
+def _orjson_default(obj: Any) -> Any:
+    """orjson无法直接处理的类型：pydantic模型按字段浅展开，其余NumPy标量取原生值"""
+    if isinstance(obj, BaseModel):
+        return dict(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"无法序列化类型 {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+
+def json_response(obj: Any, status_code: int = 200) -> Response:
+    """用orjson直接序列化查询结果并返回，跳过FastAPI对响应模型的再次校验和标准库JSON编码"""
+    return Response(content=dumps(obj), status_code=status_code, media_type="application/json")
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """根据Accept请求头选择响应格式(json、columnar或arrow)，未指定或无法匹配时返回json"""
+    if not accept:
+        return "json"
+    candidates: List[Tuple[float, int, str]] = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+    for _, _, media_type in sorted(candidates):
+        if media_type in RESPONSE_FORMATS:
+            response_format = RESPONSE_FORMATS[media_type]
+            if response_format == "arrow" and pa is None:
+                raise ValueError("服务端未安装pyarrow，不支持Arrow IPC响应格式")
+            return response_format
+        if media_type in ("*/*", "application/*"):
+            return "json"
+    return "json"
+
+
+def hits_to_columns(groups: Sequence[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """把按查询向量分组的结果行转换为列：ids、distances、query_index及每个输出字段一列"""
+    field_names: Dict[str, None] = {}
+    for hits in groups:
+        for hit in hits:
+            for name in hit:
+                if name not in ("id", "distance"):
+                    field_names.setdefault(name)
+    rows = [(query_index, hit) for query_index, hits in enumerate(groups) for hit in hits]
+    return {
+        "query_index": [query_index for query_index, _ in rows],
+        "ids": [hit["id"] for _, hit in rows],
+        "distances": [hit["distance"] for _, hit in rows],
+        "fields": {name: [hit.get(name) for _, hit in rows] for name in field_names}
+    }
+
+
+def _result_groups(result: QueryResult) -> List[List[Dict[str, Any]]]:
+    if result.batch_results is not None:
+        return result.batch_results
+    return [result.results]
+
+
+def _aggregated_groups(result: MultiDatabaseQueryResult) -> List[List[Dict[str, Any]]]:
+    if result.batch_aggregated_results is not None:
+        return result.batch_aggregated_results
+    return [result.aggregated_results]
+
+
+def _columnar_query_result(result: QueryResult) -> Dict[str, Any]:
+    groups = _result_groups(result)
+    return {
+        "database_id": result.database_id,
+        "collection_name": result.collection_name,
+        "nq": len(groups),
+        "columns": hits_to_columns(groups),
+        "metrics": result.metrics
+    }
+
+
+def to_columnar(result: Any) -> Dict[str, Any]:
+    """列式JSON布局，字段名不再在每条结果中重复"""
+    if isinstance(result, MultiDatabaseQueryResult):
+        groups = _aggregated_groups(result)
+        return {
+            "results": {db_id: _columnar_query_result(db_result) for db_id, db_result in result.results.items()},
+            "nq": len(groups),
+            "aggregated": hits_to_columns(groups),
+            "metrics": result.metrics
+        }
+    return _columnar_query_result(result)
+
+
+def to_arrow_stream(result: Any) -> bytes:
+    """编码为Arrow IPC流：一张结果表(多数据库查询时为合并后的结果)，指标以JSON存放在schema元数据中"""
+    if isinstance(result, MultiDatabaseQueryResult):
+        groups = _aggregated_groups(result)
+        metadata = {
+            "metrics": dumps(result.metrics),
+            "database_metrics": dumps({db_id: db_result.metrics for db_id, db_result in result.results.items()})
+        }
+    else:
+        groups = _result_groups(result)
+        metadata = {
+            "database_id": result.database_id,
+            "collection_name": result.collection_name,
+            "metrics": dumps(result.metrics)
+        }
+    columns = hits_to_columns(groups)
+    try:
+        arrays = {
+            "query_index": pa.array(columns["query_index"], type=pa.int32()),
+            "id": pa.array(columns["ids"]),
+            "distance": pa.array(columns["distances"], type=pa.float32())
+        }
+        for name, values in columns["fields"].items():
+            arrays[name] = pa.array(values)
+        table = pa.table(arrays).replace_schema_metadata(metadata)
+    except pa.ArrowException as e:
+        # 例如多个数据库同名字段的类型不一致
+        raise ValueError(f"查询结果无法编码为Arrow IPC格式: {e}")
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def query_response(result: Any, response_format: str = "json") -> Response:
+    """按协商的格式返回查询结果"""
+    with stage_timer("serialization"):
+        if response_format == "columnar":
+            return Response(content=dumps(to_columnar(result)), media_type=COLUMNAR_JSON_MEDIA_TYPE)
+        if response_format == "arrow":
+            return Response(content=to_arrow_stream(result), media_type=ARROW_STREAM_MEDIA_TYPE)
+        return json_response(result)
+
+
+def encode_stream_event(event: Dict[str, Any], sse: bool = False) -> bytes:
+    """编码流式查询事件：NDJSON每行一个事件，SSE以事件类型作为event字段"""
+    data = dumps(event)
+    if sse:
+        return b"event: " + event["event"].encode("utf-8") + b"\ndata: " + data + b"\n\n"
+    return data + b"\n"
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import threading
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import numpy as np
+from core.config import settings
+from core.metrics import registry
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """合并完全相同的进行中请求
+
+    同一个键的请求在第一个请求执行期间到达时，不再单独执行，而是等待并共享第一个请求的结果(或异常)。
+    请求完成后立即移除，之后到达的相同请求会重新执行。
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.collapsed = 0
+
+    @staticmethod
+    def make_key(kind: str, params: List[Any], vectors: Optional[np.ndarray] = None) -> str:
+        """请求的规范哈希：参数按键排序后序列化，向量按float32字节参与哈希"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps([kind, params], sort_keys=True, default=str).encode("utf-8"))
+        if vectors is not None:
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            digest.update(str(vectors.shape).encode("ascii"))
+            digest.update(vectors.tobytes())
+        return digest.hexdigest()
+
+    def do(self, kind: str, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """执行fn或等待相同请求的结果，返回(结果, 是否共享了其他请求的结果)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.collapsed += 1
+        if not leader:
+            collapsed_requests.inc(kind=kind)
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.executed + self.collapsed
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._calls),
+                "waiting": sum(call.waiters for call in self._calls.values()),
+                "executed": self.executed,
+                "collapsed": self.collapsed,
+                "collapse_rate": self.collapsed / total if total else 0.0
+            }
+
+
+single_flight = SingleFlight(enabled=settings.SINGLE_FLIGHT_ENABLED)
+
+collapsed_requests = registry.counter(
+    "fedui_single_flight_collapsed_total",
+    "Queries that shared the result of an identical in-flight query instead of executing",
+    ("kind",)
+)
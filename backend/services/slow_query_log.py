@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional, Iterator
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 可用于聚合的分组字段
+SLOW_QUERY_GROUP_BY = ("collection", "database", "user", "kind")
+
+
+class SlowQueryLog:
+    """慢查询日志
+
+    请求路径只把记录放入有界队列，由后台线程追加写入JSONL文件；
+    文件超过大小上限时轮转为.1、.2……，只保留backup_count个旧文件。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float,
+        enabled: bool,
+        max_bytes: int,
+        backup_count: int,
+        queue_size: int
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.dropped = 0
+
+    def is_slow(self, duration: float) -> bool:
+        return self.enabled and duration >= self.threshold
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """提交一条慢查询记录，不等待写入；队列已满时丢弃"""
+        self._ensure_writer()
+        entry = {"timestamp": time.time(), **entry}
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """写完队列中剩余的记录后停止后台线程"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning("慢查询日志队列已满，停止时未能写完全部记录")
+            return
+        thread.join(timeout=timeout)
+
+    # ---- 查询 ----
+
+    def search(
+        self,
+        user: Optional[str] = None,
+        database_id: Optional[str] = None,
+        collection_name: Optional[str] = None,
+        kind: Optional[str] = None,
+        min_duration: Optional[float] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """按条件筛选慢查询记录，最新的在前"""
+        # 只保留最后limit条匹配的记录
+        matched = deque((
+            entry for entry in self._iter_entries()
+            if (user is None or entry.get("user") == user)
+            and (database_id is None or database_id in entry.get("databases", []))
+            and (collection_name is None or collection_name in entry.get("collections", []))
+            and (kind is None or entry.get("kind") == kind)
+            and (min_duration is None or entry.get("duration", 0.0) >= min_duration)
+            and (since is None or entry.get("timestamp", 0.0) >= since)
+            and (until is None or entry.get("timestamp", 0.0) <= until)
+        ), maxlen=max(0, limit))
+        return list(reversed(matched))
+
+    def summarize(
+        self,
+        group_by: str = "collection",
+        stage: Optional[str] = "search",
+        since: Optional[float] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """按集合、数据库、用户或查询类型聚合，按指定阶段(未指定时按总耗时)的累计耗时降序返回"""
+        if group_by not in SLOW_QUERY_GROUP_BY:
+            raise ValueError(f"不支持的分组字段: {group_by}，支持: {', '.join(SLOW_QUERY_GROUP_BY)}")
+        groups: Dict[str, Dict[str, Any]] = {}
+        for entry in self._iter_entries():
+            if since is not None and entry.get("timestamp", 0.0) < since:
+                continue
+            stages = entry.get("stages", {})
+            if stage and stage not in stages:
+                # 多数据库查询的整体记录没有单个集合的阶段耗时
+                continue
+            elapsed = stages[stage] if stage else entry.get("duration", 0.0)
+            for key in _group_keys(entry, group_by):
+                group = groups.setdefault(key, {
+                    group_by: key, "count": 0, "total_time": 0.0, "max_time": 0.0, "total_results": 0
+                })
+                group["count"] += 1
+                group["total_time"] += elapsed
+                group["max_time"] = max(group["max_time"], elapsed)
+                group["total_results"] += entry.get("result_count", 0)
+        for group in groups.values():
+            group["avg_time"] = group["total_time"] / group["count"]
+        ranked = sorted(groups.values(), key=lambda group: group["total_time"], reverse=True)
+        return ranked[:max(0, limit)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "path": self.path,
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "pending": self._queue.qsize(),
+                "size_bytes": sum(os.path.getsize(path) for path in self._files() if os.path.exists(path))
+            }
+
+    # ---- 写入 ----
+
+    def _ensure_writer(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-query-log", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            # 一次取出队列中已有的全部记录批量写入
+            entries = [entry]
+            stop = False
+            while True:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                entries.append(entry)
+            try:
+                self._write(entries)
+            except Exception as e:
+                logger.error(f"写入慢查询日志时出错: {e}")
+            if stop:
+                return
+
+    def _write(self, entries: List[Dict[str, Any]]) -> None:
+        content = "".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in entries)
+        data = content.encode("utf-8")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as f:
+            f.write(data)
+        with self._lock:
+            self.recorded += len(entries)
+
+    def _rotate(self) -> None:
+        """slow_queries.jsonl -> .1 -> .2 ...，超出保留数量的文件被删除"""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    # ---- 读取 ----
+
+    def _files(self) -> List[str]:
+        """从最旧到最新的日志文件"""
+        return [f"{self.path}.{index}" for index in range(self.backup_count, 0, -1)] + [self.path]
+
+    def _iter_entries(self) -> Iterator[Dict[str, Any]]:
+        for path in self._files():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            # 正在写入的最后一行可能不完整
+                            continue
+            except FileNotFoundError:
+                continue
+
+
+def _group_keys(entry: Dict[str, Any], group_by: str) -> List[str]:
+    if group_by == "collection":
+        return [
+            f"{database_id}/{collection_name}"
+            for database_id, collection_name in zip(entry.get("databases", []), entry.get("collections", []))
+        ]
+    if group_by == "database":
+        return list(entry.get("databases", []))
+    return [str(entry.get(group_by))]
+
+
+slow_query_log = SlowQueryLog(
+    path=settings.SLOW_QUERY_LOG_PATH,
+    threshold=settings.SLOW_QUERY_THRESHOLD,
+    enabled=settings.SLOW_QUERY_LOG_ENABLED,
+    max_bytes=settings.SLOW_QUERY_LOG_MAX_MB * 1024 * 1024,
+    backup_count=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+    queue_size=settings.SLOW_QUERY_LOG_QUEUE_SIZE
+)
@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+from typing import Any, Iterator, Optional
+import numpy as np
+from core.config import settings
+from core.executors import file_executor
+
+# 支持的向量文件格式
+VECTOR_FILE_FORMATS = ("json", "npy", "fvecs", "raw")
+
+_EXTENSION_FORMATS = {
+    ".json": "json",
+    ".npy": "npy",
+    ".fvecs": "fvecs",
+    ".bin": "raw",
+    ".raw": "raw",
+    ".f32": "raw",
+    ".f16": "raw"
+}
+
+_RAW_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2")
+}
+
+_SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+async def spool_upload(upload: Any) -> str:
+    """将上传文件分块写入磁盘临时文件，返回文件路径；磁盘写入在线程池中进行，不阻塞事件循环"""
+    fd, path = await file_executor.run(tempfile.mkstemp, prefix="vectors-", dir=settings.UPLOAD_SPOOL_DIR)
+    try:
+        f = os.fdopen(fd, "wb")
+        try:
+            while True:
+                chunk = await upload.read(_SPOOL_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await file_executor.run(f.write, chunk)
+        finally:
+            await file_executor.run(f.close)
+    except Exception:
+        await file_executor.run(os.unlink, path)
+        raise
+    return path
+
+
+def detect_vector_format(filename: Optional[str], vector_format: Optional[str] = None) -> str:
+    """根据显式指定的格式或文件扩展名确定向量文件格式"""
+    if vector_format:
+        vector_format = vector_format.lower()
+        if vector_format not in VECTOR_FILE_FORMATS:
+            raise ValueError(f"不支持的向量文件格式: {vector_format}，支持: {', '.join(VECTOR_FILE_FORMATS)}")
+        return vector_format
+    extension = os.path.splitext(filename or "")[1].lower()
+    return _EXTENSION_FORMATS.get(extension, "json")
+
+
+def open_vector_file(
+    path: str,
+    vector_format: str,
+    dim: Optional[int] = None,
+    dtype: str = "float32"
+) -> np.ndarray:
+    """以内存映射方式打开向量文件，返回形状为(nq, dim)的数组
+
+    - npy: NumPy数组文件
+    - fvecs: 每个向量前带int32维度的小端float32格式
+    - raw: 无文件头的小端float32/float16数据，需要指定dim
+    - json: 向量或向量列表(兼容旧格式，需完整读入内存)
+    """
+    if vector_format == "npy":
+        vectors = np.load(path, mmap_mode="r", allow_pickle=False)
+    elif vector_format == "fvecs":
+        vectors = _open_fvecs(path)
+    elif vector_format == "raw":
+        vectors = _open_raw(path, dim, dtype)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                vectors = np.asarray(json.load(f), dtype=np.float32)
+            except (TypeError, ValueError):
+                # 包括JSON语法错误、非数值元素及长度不一的向量
+                raise ValueError("无效的向量文件格式，请提供有效的JSON")
+
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    if vectors.ndim != 2 or vectors.shape[0] == 0:
+        raise ValueError(f"向量文件的形状无效: {vectors.shape}")
+    if not np.issubdtype(vectors.dtype, np.floating):
+        raise ValueError(f"向量文件的数据类型必须是浮点数，实际为 {vectors.dtype}")
+    if dim is not None and vectors.shape[1] != dim:
+        raise ValueError(f"向量维度为 {vectors.shape[1]}，与声明的维度 {dim} 不一致")
+    _check_finite(vectors)
+    return vectors
+
+
+def _check_finite(vectors: np.ndarray) -> None:
+    """与JSON及base64向量相同，拒绝NaN和inf；内存映射的文件按块检查，不整体载入内存"""
+    step = max(1, _SPOOL_CHUNK_SIZE // (vectors.itemsize * max(1, vectors.shape[1])))
+    for start in range(0, vectors.shape[0], step):
+        if not np.isfinite(vectors[start:start + step]).all():
+            raise ValueError("向量数据包含无效数值")
+
+
+def _open_raw(path: str, dim: Optional[int], dtype: str) -> np.ndarray:
+    if not dim or dim <= 0:
+        raise ValueError("原始二进制向量文件需要指定维度dim")
+    if dtype not in _RAW_DTYPES:
+        raise ValueError(f"不支持的数据类型: {dtype}，支持: {', '.join(_RAW_DTYPES)}")
+    item_size = _RAW_DTYPES[dtype].itemsize
+    size = os.path.getsize(path)
+    if size == 0 or size % (item_size * dim) != 0:
+        raise ValueError(f"文件大小 {size} 字节不是维度 {dim} 的 {dtype} 向量的整数倍")
+    return np.memmap(path, dtype=_RAW_DTYPES[dtype], mode="r").reshape(-1, dim)
+
+
+def _open_fvecs(path: str) -> np.ndarray:
+    size = os.path.getsize(path)
+    if size < 4:
+        raise ValueError("fvecs文件为空")
+    header = np.memmap(path, dtype="<i4", mode="r")
+    dim = int(header[0])
+    if dim <= 0 or size % ((dim + 1) * 4) != 0:
+        raise ValueError("无效的fvecs文件")
+    records = header.reshape(-1, dim + 1)
+    if not np.all(records[:, 0] == dim):
+        raise ValueError("fvecs文件中的向量维度不一致")
+    return records.view("<f4")[:, 1:]
+
+
+def iter_vector_batches(vectors: np.ndarray, batch_size: int) -> Iterator[np.ndarray]:
+    """按批次读取向量，每次只把一个批次转换为float32"""
+    batch_size = max(1, batch_size)
+    for start in range(0, vectors.shape[0], batch_size):
+        yield np.ascontiguousarray(vectors[start:start + batch_size], dtype=np.float32)